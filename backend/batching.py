@@ -0,0 +1,201 @@
+"""
+Batched generation with length bucketing.
+
+Chunks waiting for the same model and generation settings, from one document or
+from concurrent requests of the same user and priority class, are sorted by token
+length and grouped so that a batch never pads much beyond its own inputs; results
+are handed back in caller order.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+from transformers.modeling_outputs import BaseModelOutput
+
+from encoder_cache import encoder_cache
+from inference import current_flow, inference_pool
+
+# Chunks generated together in one generate() call
+GENERATE_BATCH_SIZE = int(os.getenv("GENERATE_BATCH_SIZE", "4"))
+
+# Largest share of padding tokens accepted when adding a chunk to a batch
+BATCH_MAX_PADDING = float(os.getenv("BATCH_MAX_PADDING", "0.25"))
+
+# How long a batch waits for chunks from the flow's other requests before it runs (0 disables cross-request batching)
+BATCH_WAIT_MS = int(os.getenv("BATCH_WAIT_MS", "20"))
+
+
+def length_buckets(lengths, batch_size=GENERATE_BATCH_SIZE, max_padding=BATCH_MAX_PADDING):
+    """
+    Groups item indices into batches: longest first, and a batch is closed when it is
+    full or the next item would push its padding share above max_padding.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    current = []
+    for i in order:
+        if current:
+            longest = lengths[current[0]]
+            real = sum(lengths[j] for j in current) + lengths[i]
+            padding = 1 - real / (longest * (len(current) + 1))
+            if len(current) >= batch_size or padding > max_padding:
+                batches.append(current)
+                current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _padded_tokens(batches, lengths):
+    return sum(max(lengths[i] for i in batch) * len(batch) for batch in batches)
+
+
+class PaddingStats:
+    """Real vs. padded encoder tokens of the batches run, compared with batching in arrival order."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.arrival_order_padded_tokens = 0
+
+    def record(self, lengths, batches):
+        arrival = [list(range(i, min(i + GENERATE_BATCH_SIZE, len(lengths))))
+                   for i in range(0, len(lengths), GENERATE_BATCH_SIZE)]
+        with self._lock:
+            self.batches += len(batches)
+            self.items += len(lengths)
+            self.real_tokens += sum(lengths)
+            self.padded_tokens += _padded_tokens(batches, lengths)
+            self.arrival_order_padded_tokens += _padded_tokens(arrival, lengths)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else None,
+                "real_tokens": self.real_tokens,
+                "padded_tokens": self.padded_tokens,
+                "padding_efficiency": round(self.real_tokens / self.padded_tokens, 3) if self.padded_tokens else None,
+                "arrival_order_efficiency": (
+                    round(self.real_tokens / self.arrival_order_padded_tokens, 3)
+                    if self.arrival_order_padded_tokens else None
+                ),
+            }
+
+
+padding_stats = PaddingStats()
+
+
+def generate_padded(model, batch_ids, **generate_kwargs):
+    """
+    Runs one generate() over right-padded inputs, returning one output id tensor per input.
+    Encoder states come from encoder_cache per input and are padded to the longest one;
+    padded positions are masked out of cross-attention.
+    """
+    pad_token_id = model.config.pad_token_id
+    longest = max(len(ids) for ids in batch_ids)
+    input_tensor = torch.full((len(batch_ids), longest), pad_token_id, dtype=torch.long, device=model.device)
+    attention_mask = torch.zeros_like(input_tensor)
+    hidden_states = []
+    for row, ids in enumerate(batch_ids):
+        input_tensor[row, :len(ids)] = torch.tensor(ids, device=model.device)
+        attention_mask[row, :len(ids)] = 1
+        hidden_states.append(encoder_cache.encode(
+            model, input_tensor[row:row + 1, :len(ids)], attention_mask[row:row + 1, :len(ids)]
+        ).last_hidden_state[0])
+
+    encoder_states = hidden_states[0].new_zeros(len(batch_ids), longest, hidden_states[0].shape[-1])
+    for row, hidden in enumerate(hidden_states):
+        encoder_states[row, :hidden.shape[0]] = hidden
+
+    with torch.no_grad():
+        output = model.generate(
+            input_tensor,
+            attention_mask=attention_mask,
+            encoder_outputs=BaseModelOutput(last_hidden_state=encoder_states),
+            **generate_kwargs
+        )
+    return list(output)
+
+
+def generate_bucketed(model, items, batch_size=None, **generate_kwargs):
+    """Generates for a list of token id lists in length buckets; outputs are in input order."""
+    lengths = [len(ids) for ids in items]
+    batches = length_buckets(lengths, batch_size or GENERATE_BATCH_SIZE)
+    padding_stats.record(lengths, batches)
+    outputs = [None] * len(items)
+    for batch in batches:
+        for i, output in zip(batch, generate_padded(model, [items[i] for i in batch], **generate_kwargs)):
+            outputs[i] = output
+    return outputs
+
+
+class GenerationBatcher:
+    """
+    Joins generate() work from concurrent inference workers.
+
+    Only requests of the same inference pool flow (user and priority class) are
+    joined, so one worker never spends its turn on another user's chunks and fair
+    queuing still holds. The first worker to submit for a (model, settings, flow)
+    key waits BATCH_WAIT_MS if another job of the flow is running, then takes every
+    chunk queued for that key, runs them in length buckets on its own thread and
+    hands each worker its results. Workers whose chunks were taken by another
+    worker's batch just wait for them.
+    """
+
+    def __init__(self, wait_ms=BATCH_WAIT_MS):
+        self.wait_ms = wait_ms
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.joined_batches = 0
+
+    @staticmethod
+    def _key(model, generate_kwargs, flow):
+        return id(model), tuple(sorted(generate_kwargs.items())), flow
+
+    def generate(self, model, items, batch_size=None, **generate_kwargs):
+        """
+        Returns one output id tensor per token id list in items, in order. A batch_size
+        below GENERATE_BATCH_SIZE (memory-limited requests) runs alone in smaller batches.
+        """
+        if self.wait_ms <= 0 or (batch_size and batch_size < GENERATE_BATCH_SIZE):
+            return generate_bucketed(model, items, batch_size, **generate_kwargs)
+
+        flow = current_flow()
+        key = self._key(model, generate_kwargs, flow)
+        futures = [Future() for _ in items]
+        with self._lock:
+            leader = key not in self._pending
+            self._pending.setdefault(key, []).extend(zip(items, futures))
+
+        if leader:
+            # Alone in its flow nothing can join, so the batch runs right away
+            if inference_pool.flow_active(flow) > 1:
+                time.sleep(self.wait_ms / 1000)
+            with self._lock:
+                jobs = self._pending.pop(key)
+                if len(jobs) > len(items):
+                    self.joined_batches += 1
+            try:
+                outputs = generate_bucketed(model, [ids for ids, _ in jobs], **generate_kwargs)
+                for (_, future), output in zip(jobs, outputs):
+                    future.set_result(output)
+            except BaseException as e:
+                for _, future in jobs:
+                    if not future.done():
+                        future.set_exception(e)
+
+        return [future.result() for future in futures]
+
+    def stats(self):
+        return {**padding_stats.stats(), "wait_ms": self.wait_ms, "cross_request_batches": self.joined_batches}
+
+
+generation_batcher = GenerationBatcher()
@@ -0,0 +1,76 @@
+"""
+Throughput of login (bcrypt in the auth pool) and of authenticated requests
+(GET /auth/me) with and without the verified-token cache.
+
+Usage: python bench_auth.py [--concurrency 16] [--logins 32] [--requests 2000]
+Runs against a temporary SQLite database in-process.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, create_db_engine, get_db
+from routes import auth
+
+
+async def timed_burst(client, total, concurrency, request):
+    """Sends total requests, concurrency at a time; returns requests per second."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            response = await request(client)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def main(args):
+    path = os.path.join(tempfile.mkdtemp(), "bench_auth.db")
+    engine = create_db_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    def bench_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.dependency_overrides[get_db] = bench_db
+    credentials = {"email": "bench@example.com", "password": "bench-password"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        (await client.post("/auth/register", json={"username": "bench", **credentials})).raise_for_status()
+        login = await client.post("/auth/login", json=credentials)
+        headers = {"Authorization": f"Bearer {login.json()['token']}"}
+
+        rate = await timed_burst(client, args.logins, args.concurrency,
+                                 lambda c: c.post("/auth/login", json=credentials))
+        print(f"login           {rate:8.1f} req/s   ({auth.auth_pool.workers} bcrypt workers)")
+
+        for label, ttl in [("me, no cache", 0), ("me, cached", auth.AUTH_CACHE_TTL_SECONDS or 60)]:
+            auth.user_cache.ttl = ttl
+            rate = await timed_burst(client, args.requests, args.concurrency,
+                                     lambda c: c.get("/auth/me", headers=headers))
+            print(f"{label:<15} {rate:8.1f} req/s")
+        print(f"token cache: {auth.user_cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""
+Database size and read latency before/after compressing text columns, plus the
+size of the full-text search index, which keeps its own uncompressed copy of the
+text (see search.py).
+
+Usage: python bench_compression.py [path/to/SummAIze.db]
+Works on a temporary copy; the given database is not modified.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+import db_types
+from database import create_db_engine
+from migrate_compression import migrate, train_dictionary, vacuum
+from models import PDF, Summarization
+from search import SEARCH_TABLE
+
+
+def read_all(engine, repeats=5):
+    """Average seconds to load every PDF text and summary through the ORM."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with Session(engine) as db:
+            chars = sum(len(t or "") for (t,) in db.query(PDF.text))
+            chars += sum(len(t or "") for (t,) in db.query(Summarization.summary_text))
+        timings.append(time.perf_counter() - start)
+    return sum(timings) / len(timings), chars
+
+
+def search_index_bytes(engine):
+    """(stored body copy, inverted index) bytes of the FTS5 table, or None when it doesn't exist."""
+    with engine.connect() as conn:
+        try:
+            copy = conn.execute(text(f"SELECT SUM(LENGTH(CAST(c0 AS BLOB))) FROM {SEARCH_TABLE}_content")).scalar()
+            index = conn.execute(text(f"SELECT SUM(LENGTH(block)) FROM {SEARCH_TABLE}_data")).scalar()
+        except OperationalError:
+            return None
+    return copy or 0, index or 0
+
+
+def report(label, db_path, engine):
+    seconds, chars = read_all(engine)
+    size = os.path.getsize(db_path)
+    print(f"{label:<8} size {size / 1024:10.1f} KiB   full read {seconds * 1000:8.1f} ms   ({chars} chars)")
+    fts = search_index_bytes(engine)
+    if fts:
+        print(f"{'':<8} of which full-text search: body copy {fts[0] / 1024:.1f} KiB, index {fts[1] / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "SummAIze.db"
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        shutil.copy(source, db_path)
+        engine = create_db_engine(f"sqlite:///{db_path}")
+        vacuum(engine)
+        report("before", db_path, engine)
+
+        db_types.DICTIONARY_FOLDER = os.path.join(tmp, "zdicts")
+        train_dictionary(engine)
+        migrate(engine)
+        vacuum(engine)
+        engine.dispose()
+        engine = create_db_engine(f"sqlite:///{db_path}")
+        report("after", db_path, engine)
+        engine.dispose()
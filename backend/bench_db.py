@@ -0,0 +1,73 @@
+"""
+Concurrent insert benchmark: default SQLite engine vs. the tuned engine from database.py.
+
+Usage: python bench_db.py [--threads 8] [--inserts 200]
+Each thread commits feedback rows one at a time, the way submit_feedback does.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, create_db_engine
+from models import User, Feedback
+
+
+def run_inserts(engine, threads, inserts):
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(User(username="bench", email="bench@example.com", password="x"))
+        db.commit()
+        user_id = db.query(User.id).scalar()
+
+    errors = []
+
+    def worker():
+        db = Session()
+        try:
+            for i in range(inserts):
+                try:
+                    db.add(Feedback(user_id=user_id, rating=(i % 5) + 1, comment="benchmark feedback"))
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    errors.append(str(e))
+        finally:
+            db.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT COUNT(*) FROM feedback")).scalar()
+    return rows / elapsed, rows, len(errors)
+
+
+def bench(label, make_engine, threads, inserts):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = make_engine(url)
+        Base.metadata.create_all(bind=engine)
+        throughput, rows, errors = run_inserts(engine, threads, inserts)
+        engine.dispose()
+    print(f"{label:<10} {throughput:10.1f} inserts/s  ({rows} rows, {errors} failed)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--inserts", type=int, default=200, help="inserts per thread")
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads x {args.inserts} single-row commits")
+    bench("default", lambda url: create_engine(url, connect_args={"check_same_thread": False}), args.threads, args.inserts)
+    bench("tuned", create_db_engine, args.threads, args.inserts)
@@ -0,0 +1,55 @@
+"""
+Queue fairness check: interactive wait times while another user floods the pool with batch jobs.
+
+Usage: python bench_fairness.py [--workers 2] [--flood 60] [--interactive 10] [--job-ms 50]
+Jobs sleep instead of running a model. The same load is replayed with every job
+under one shared user and class (what a plain FIFO queue does) for comparison.
+"""
+import argparse
+import time
+
+from inference import InferencePool
+
+
+def job(seconds, submitted, waits):
+    waits.append(time.monotonic() - submitted)
+    time.sleep(seconds)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_scenario(workers, flood, interactive, job_seconds, fair):
+    """Returns queue waits in seconds per kind of job ("batch flood" / "interactive")."""
+    pool = InferencePool("bench", workers, flood + interactive)
+    waits = {"batch flood": [], "interactive": []}
+    # One user bulk-submits long documents as batch jobs...
+    futures = [
+        pool.submit(job, job_seconds * 4, time.monotonic(), waits["batch flood"],
+                    user_id=1 if fair else 0, priority="batch" if fair else "interactive", cost=4)
+        for _ in range(flood)
+    ]
+    # ...while another user sends interactive requests at a steady rate
+    for _ in range(interactive):
+        time.sleep(job_seconds)
+        futures.append(pool.submit(job, job_seconds, time.monotonic(), waits["interactive"], user_id=2 if fair else 0))
+    for future in futures:
+        future.result()
+    return waits
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--flood", type=int, default=60)
+    parser.add_argument("--interactive", type=int, default=10)
+    parser.add_argument("--job-ms", type=int, default=50)
+    args = parser.parse_args()
+
+    for label, fair in [("fifo (single queue)", False), ("fair share", True)]:
+        print(f"\n{label}")
+        for kind, waits in run_scenario(args.workers, args.flood, args.interactive, args.job_ms / 1000, fair).items():
+            print(f"  {kind:<12} jobs {len(waits):>3}   p50 {percentile(waits, 0.5):6.3f} s   "
+                  f"p95 {percentile(waits, 0.95):6.3f} s   max {max(waits):6.3f} s")
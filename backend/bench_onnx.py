@@ -0,0 +1,72 @@
+"""
+Equivalence check and latency comparison: torch vs ONNX Runtime backend.
+
+Usage: python bench_onnx.py [model_path] [--runs 3]
+Exports model_path to ONNX first if needed. Exits non-zero when greedy
+decoding on the fixed input differs between the backends.
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+from transformers import BartForConditionalGeneration
+
+from onnx_backend import export_onnx, load_onnx_model, onnx_path
+from tokenization import load_tokenizer
+
+SAMPLE_TEXT = (
+    "In a historic move, a coalition of global leaders has reached a tentative agreement to combat climate change "
+    "by significantly reducing carbon emissions over the next two decades. The agreement, which follows years of "
+    "intense negotiations, aims to limit global temperature rise to 1.5°C above pre-industrial levels. However, "
+    "critics argue that the agreement lacks strict enforcement mechanisms, raising concerns about its effectiveness. "
+    "Some developing nations have expressed skepticism, stating that wealthier countries should bear a greater share "
+    "of the financial burden. Despite these concerns, environmental advocates have praised the agreement as a "
+    "crucial step forward, emphasizing the need for global cooperation in addressing climate change."
+)
+
+GREEDY = dict(max_length=128, min_length=30, num_beams=1, do_sample=False)
+BEAM = dict(max_length=300, min_length=100, num_beams=4, length_penalty=1.2, early_stopping=False, repetition_penalty=1.2)
+
+
+def generate(model, inputs, **kwargs):
+    with torch.no_grad():
+        return model.generate(inputs["input_ids"], attention_mask=inputs["attention_mask"], **kwargs)
+
+
+def latency(model, inputs, runs, **kwargs):
+    generate(model, inputs, **kwargs)  # warm-up
+    start = time.perf_counter()
+    for _ in range(runs):
+        generate(model, inputs, **kwargs)
+    return (time.perf_counter() - start) / runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model_path", nargs="?", default="./bart_model")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if not os.path.isdir(onnx_path(args.model_path)):
+        export_onnx(args.model_path)
+
+    tokenizer = load_tokenizer(args.model_path)
+    torch_model = BartForConditionalGeneration.from_pretrained(args.model_path).eval()
+    onnx_model = load_onnx_model(args.model_path)
+    inputs = tokenizer(SAMPLE_TEXT, return_tensors="pt", max_length=1024, truncation=True)
+
+    greedy_torch = generate(torch_model, inputs, **GREEDY)
+    greedy_onnx = generate(onnx_model, inputs, **GREEDY)
+    greedy_equal = torch.equal(greedy_torch, greedy_onnx)
+    beam_equal = torch.equal(generate(torch_model, inputs, **BEAM), generate(onnx_model, inputs, **BEAM))
+    print(f"greedy output identical: {greedy_equal}")
+    print(f"beam (4) output identical: {beam_equal}")
+
+    for label, settings in [("greedy", GREEDY), ("beam 4", BEAM)]:
+        torch_seconds = latency(torch_model, inputs, args.runs, **settings)
+        onnx_seconds = latency(onnx_model, inputs, args.runs, **settings)
+        print(f"{label:<8} torch {torch_seconds:7.3f} s   onnx {onnx_seconds:7.3f} s   speedup {torch_seconds / onnx_seconds:5.2f}x")
+
+    sys.exit(0 if greedy_equal else 1)
@@ -0,0 +1,130 @@
+"""
+Crash/resume check for checkpointed summarization.
+
+Usage: python bench_resume.py [--model-type distilled] [--words 6000] [--kill-after 2] [--compare]
+Run from the backend directory (models load from ./bart_model etc.). A worker
+process summarizes a long document against a temporary SQLite database and is
+killed (SIGKILL) once --kill-after chunk summaries are checkpointed. A second
+worker retries the same document; the check passes when it reads back exactly
+the checkpointed chunks, generates only the missing ones and leaves no
+checkpoints behind. --compare also runs the document uninterrupted and reports
+whether the summaries match. Exits non-zero on failure.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_onnx import SAMPLE_TEXT
+
+
+def long_document(words):
+    """Numbered copies of the sample text, so chunks differ, with at least this many words."""
+    sections = []
+    while sum(len(section.split()) for section in sections) < words:
+        sections.append(f"Section {len(sections) + 1}. {SAMPLE_TEXT}")
+    return "\n\n".join(sections)
+
+
+def run_worker(args):
+    """Summarizes the document once and prints RESULT {...} with checkpoint counters."""
+    import metrics
+    from database import Base, engine
+    from routes import summary
+    from tokenization import chunk_text, encode_document
+
+    Base.metadata.create_all(bind=engine)
+    model_type = args.model_type if args.model_type in summary.MODELS else "pretrained"
+    model, model_tokenizer = summary.MODELS[model_type]
+    text = long_document(args.words)
+    start = time.perf_counter()
+    result = summary.summarize_large_text(text, model, model_tokenizer)
+    counters = metrics.snapshot()["counters"]
+    print("RESULT " + json.dumps({
+        "model_type": model_type,
+        "chunks": len(encode_document(text, model_tokenizer, chunk_text)),
+        "resumed": counters.get("checkpoint_chunks_resumed", 0),
+        "generated": counters.get("checkpoint_chunks_saved", 0),
+        "seconds": round(time.perf_counter() - start, 1),
+        "summary": result,
+    }), flush=True)
+
+
+def checkpoint_count(engine):
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        try:
+            return conn.execute(text("SELECT COUNT(*) FROM summary_checkpoints")).scalar()
+        except Exception:
+            return 0  # table not created by the worker yet
+
+
+def start_worker(args):
+    command = [sys.executable, __file__, "--worker", "--model-type", args.model_type, "--words", str(args.words)]
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+
+def worker_result(process):
+    output, _ = process.communicate()
+    for line in output.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"worker exited with {process.returncode} without a result")
+
+
+def main(args):
+    from database import create_db_engine
+    engine = create_db_engine(os.environ["DATABASE_URL"])
+
+    worker = start_worker(args)
+    while checkpoint_count(engine) < args.kill_after:
+        if worker.poll() is not None:
+            sys.exit("Worker finished before it could be killed; use a longer --words or a smaller --kill-after")
+        time.sleep(0.1)
+    worker.kill()
+    worker.wait()
+    checkpointed = checkpoint_count(engine)
+    print(f"Killed worker after {checkpointed} checkpointed chunks")
+
+    resumed = worker_result(start_worker(args))
+    remaining = checkpoint_count(engine)
+    print(f"Retry ({resumed['model_type']}): {resumed['chunks']} chunks, {resumed['resumed']} from checkpoints, "
+          f"{resumed['generated']} generated, {resumed['seconds']} s; {remaining} checkpoints left")
+
+    failures = []
+    if resumed["resumed"] != checkpointed:
+        failures.append(f"expected {checkpointed} chunks from checkpoints, got {resumed['resumed']}")
+    if resumed["generated"] != resumed["chunks"] - checkpointed:
+        failures.append(f"expected {resumed['chunks'] - checkpointed} chunks generated, got {resumed['generated']}")
+    if remaining:
+        failures.append(f"{remaining} checkpoints were not cleared")
+
+    if args.compare:
+        fresh = worker_result(start_worker(args))
+        same = fresh["summary"] == resumed["summary"]
+        print(f"Uninterrupted run: {fresh['seconds']} s; summary {'identical' if same else 'differs'} after resume")
+
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+    print("PASS: only the missing chunks were regenerated")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-type", default="distilled")
+    parser.add_argument("--words", type=int, default=6000)
+    parser.add_argument("--kill-after", type=int, default=2)
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+    else:
+        # Workers inherit the temporary database and checkpoint after every chunk
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_resume.db')}"
+        os.environ.setdefault("CHECKPOINT_INTERVAL_CHUNKS", "1")
+        main(args)
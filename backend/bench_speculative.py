@@ -0,0 +1,66 @@
+"""
+Equivalence check and latency comparison: greedy decoding with and without a draft model.
+
+Usage: python bench_speculative.py [target_path] [draft_path] [--runs 3]
+Exits non-zero when assisted (speculative) decoding changes the greedy output.
+"""
+import argparse
+import sys
+import time
+
+import torch
+from transformers import BartForConditionalGeneration
+
+import speculative
+from bench_onnx import SAMPLE_TEXT
+from tokenization import load_tokenizer
+
+GREEDY = dict(max_length=300, min_length=100, num_beams=1, do_sample=False, repetition_penalty=1.2)
+
+
+def generate(model, inputs, draft=None):
+    with torch.no_grad():
+        if draft is None:
+            return model.generate(inputs["input_ids"], attention_mask=inputs["attention_mask"], **GREEDY)
+        encoder_outputs = model.get_encoder()(**inputs)
+        return speculative.assisted_generate(
+            model, inputs["input_ids"], inputs["attention_mask"], encoder_outputs, **GREEDY
+        )
+
+
+def latency(model, inputs, runs, draft=None):
+    with speculative.speculative_decoding(draft, enabled=draft is not None):
+        generate(model, inputs, draft)  # warm-up
+    start = time.perf_counter()
+    with speculative.speculative_decoding(draft, enabled=draft is not None) as stats:
+        for _ in range(runs):
+            generate(model, inputs, draft)
+    return (time.perf_counter() - start) / runs, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target_path", nargs="?", default="./bart_model")
+    parser.add_argument("draft_path", nargs="?", default="./distilbart_model")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    tokenizer = load_tokenizer(args.target_path)
+    target = BartForConditionalGeneration.from_pretrained(args.target_path).eval()
+    draft = BartForConditionalGeneration.from_pretrained(args.draft_path).eval()
+    inputs = tokenizer(SAMPLE_TEXT, return_tensors="pt", max_length=1024, truncation=True)
+
+    plain = generate(target, inputs)
+    with speculative.speculative_decoding(draft):
+        assisted = generate(target, inputs, draft)
+    identical = torch.equal(plain, assisted)
+    print(f"greedy output identical: {identical}")
+
+    plain_seconds, _ = latency(target, inputs, args.runs)
+    assisted_seconds, stats = latency(target, inputs, args.runs, draft)
+    print(f"plain     {plain_seconds:7.3f} s")
+    print(f"assisted  {assisted_seconds:7.3f} s   speedup {plain_seconds / assisted_seconds:5.2f}x")
+    print(f"draft tokens proposed {stats.proposed}, accepted {stats.accepted}, "
+          f"acceptance rate {stats.acceptance_rate}, target steps {stats.target_steps}")
+
+    sys.exit(0 if identical else 1)
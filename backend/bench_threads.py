@@ -0,0 +1,70 @@
+"""
+Throughput sweep: inference workers x torch intra-op threads per worker.
+
+Usage: python bench_threads.py [model_path] [--requests 8] [--workers 1,2,4] [--threads 1,2,4] [--pin]
+Each configuration runs the same summaries through an InferencePool and reports
+summaries per second; set INFERENCE_WORKERS / TORCH_INTRA_OP_THREADS (and
+INFERENCE_CPU_AFFINITY=auto with --pin) from the best row.
+"""
+import argparse
+import os
+import time
+
+import torch
+from transformers import BartForConditionalGeneration
+
+from bench_onnx import SAMPLE_TEXT
+from inference import InferencePool, configure_torch_threads, parse_cpu_sets
+from tokenization import load_tokenizer
+
+SETTINGS = dict(max_length=150, min_length=50, num_beams=4, length_penalty=1.2, early_stopping=False)
+
+
+def summarize(model, inputs):
+    with torch.no_grad():
+        return model.generate(inputs["input_ids"], attention_mask=inputs["attention_mask"], **SETTINGS)
+
+
+def throughput(model, inputs, workers, threads, requests, pin):
+    cpu_sets = parse_cpu_sets("auto", workers) if pin else None
+    pool = InferencePool(f"bench-{workers}x{threads}", workers, requests, threads, cpu_sets)
+    for future in [pool.submit(summarize, model, inputs) for _ in range(workers)]:
+        future.result()  # warm-up, one per worker
+    start = time.perf_counter()
+    for future in [pool.submit(summarize, model, inputs) for _ in range(requests)]:
+        future.result()
+    return requests / (time.perf_counter() - start)
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model_path", nargs="?", default="./bart_model")
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--workers", type=int_list, default=[1, 2, 4])
+    parser.add_argument("--threads", type=int_list, default=None, help="default: 1, 2, 4, ... up to the core count")
+    parser.add_argument("--pin", action="store_true", help="pin each worker to its own core set")
+    args = parser.parse_args()
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    thread_counts = args.threads or [n for n in (1, 2, 4, 8, 16, 32, 64) if n <= cores]
+    configure_torch_threads(intra_op_threads=1)
+
+    tokenizer = load_tokenizer(args.model_path)
+    model = BartForConditionalGeneration.from_pretrained(args.model_path).eval()
+    inputs = tokenizer(SAMPLE_TEXT, return_tensors="pt", max_length=1024, truncation=True)
+
+    print(f"{cores} cores available, {args.requests} summaries per configuration")
+    results = []
+    for workers in args.workers:
+        for threads in thread_counts:
+            rate = throughput(model, inputs, workers, threads, args.requests, args.pin)
+            flag = "  (oversubscribed)" if workers * threads > cores else ""
+            print(f"workers {workers:>2} x threads {threads:>2}: {rate:6.2f} summaries/s{flag}")
+            results.append((rate, workers, threads))
+
+    rate, workers, threads = max(results)
+    print(f"\nbest: INFERENCE_WORKERS={workers} TORCH_INTRA_OP_THREADS={threads} ({rate:.2f} summaries/s)")
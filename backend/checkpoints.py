@@ -0,0 +1,115 @@
+"""
+Checkpoints for long hierarchical summarizations.
+
+Chunk summaries of a long document are written to summary_checkpoints every
+CHECKPOINT_INTERVAL_CHUNKS chunks, keyed by a hash of the input text, the model
+checkpoint and the effective generation settings. When the same summarization is
+retried after the worker died or restarted, completed chunks are read back and
+only the missing ones are generated. A run's rows are deleted once its summary
+is complete; rows of runs that were never retried expire after
+CHECKPOINT_MAX_AGE_HOURS.
+
+Checkpointing is best effort: database errors are logged and never fail a summary.
+"""
+import hashlib
+import json
+import os
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+import metrics
+from database import SessionLocal
+from models import SummaryCheckpoint
+
+# Documents (or summary levels) with at least this many chunks are checkpointed (0 disables)
+CHECKPOINT_MIN_CHUNKS = int(os.getenv("CHECKPOINT_MIN_CHUNKS", "4"))
+
+# Completed chunks are written after every this many
+CHECKPOINT_INTERVAL_CHUNKS = int(os.getenv("CHECKPOINT_INTERVAL_CHUNKS", "8"))
+
+# Checkpoints of runs that were never retried are removed after this long
+CHECKPOINT_MAX_AGE_HOURS = float(os.getenv("CHECKPOINT_MAX_AGE_HOURS", "24"))
+
+
+def run_key(text, *params):
+    """Identifies one summarization run: the input text plus everything that changes its output."""
+    digest = hashlib.sha256(text.encode("utf-8"))
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class RunCheckpoint:
+    """Completed chunk summaries of one run (one document, or one level of a cross-document summary)."""
+
+    def __init__(self, key, level=1):
+        self.key = key
+        self.level = level
+
+    def load(self):
+        """Returns {position: summary} of the chunks completed by earlier attempts."""
+        db = SessionLocal()
+        try:
+            rows = db.query(SummaryCheckpoint.position, SummaryCheckpoint.summary_text).filter(
+                SummaryCheckpoint.run_key == self.key
+            ).all()
+        except SQLAlchemyError as e:
+            print(f"⚠️ Could not read summary checkpoints: {e}")
+            return {}
+        finally:
+            db.close()
+        if rows:
+            metrics.increment("checkpoint_chunks_resumed", len(rows))
+            print(f"♻️ Resuming summarization: {len(rows)} chunks from checkpoints")
+        return dict(rows)
+
+    def save(self, summaries):
+        """Stores {position: summary} of newly completed chunks."""
+        db = SessionLocal()
+        try:
+            for position, summary in summaries.items():
+                # merge: a concurrent identical request may have stored the same chunk
+                db.merge(SummaryCheckpoint(
+                    run_key=self.key, position=position, level=self.level, summary_text=summary
+                ))
+            db.commit()
+            metrics.increment("checkpoint_chunks_saved", len(summaries))
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"⚠️ Could not write summary checkpoints: {e}")
+        finally:
+            db.close()
+
+    def clear(self):
+        """Drops the run's checkpoints once its result is complete."""
+        db = SessionLocal()
+        try:
+            db.query(SummaryCheckpoint).filter(SummaryCheckpoint.run_key == self.key).delete()
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"⚠️ Could not clear summary checkpoints: {e}")
+        finally:
+            db.close()
+
+
+def _age_cutoff(dialect, max_age_hours):
+    """now() minus max_age_hours on the database clock, the one created_at defaults are taken from."""
+    if dialect.name == "sqlite":
+        return func.datetime("now", f"-{max_age_hours} hours")
+    return func.now() - func.make_interval(0, 0, 0, 0, 0, 0, max_age_hours * 3600)
+
+
+def purge_stale_checkpoints(max_age_hours=CHECKPOINT_MAX_AGE_HOURS):
+    """Deletes checkpoints of runs older than max_age_hours (crashed runs that were never retried)."""
+    db = SessionLocal()
+    try:
+        cutoff = _age_cutoff(db.bind.dialect, max_age_hours)
+        deleted = db.query(SummaryCheckpoint).filter(SummaryCheckpoint.created_at < cutoff).delete(
+            synchronize_session=False
+        )
+        db.commit()
+        if deleted:
+            print(f"🧹 Removed {deleted} stale summary checkpoints")
+    finally:
+        db.close()
@@ -0,0 +1,140 @@
+import glob
+import os
+import threading
+import zlib
+
+from sqlalchemy import type_coerce
+from sqlalchemy.types import LargeBinary, Text, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # zlib is used when zstandard isn't installed
+    zstandard = None
+
+# Values shorter than this (UTF-8 bytes) are stored as plain text
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "6"))
+
+# Trained zstd dictionaries (see migrate_compression.py); the newest one is used for new values
+DICTIONARY_FOLDER = os.getenv("COMPRESSION_DICTIONARY_FOLDER", "zdicts")
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZLIB_PREFIX = b"\xffZL"  # 0xFF never starts valid UTF-8, so this can't clash with plain text
+
+_local = threading.local()  # zstd (de)compressors are not thread-safe
+_dictionaries = {}
+_current_dictionary = None
+
+
+def load_dictionaries(folder=DICTIONARY_FOLDER):
+    """(Re)loads trained dictionaries; every one stays available for decompressing older rows."""
+    global _current_dictionary
+    if zstandard is None:
+        return
+    newest = None
+    for path in sorted(glob.glob(os.path.join(folder, "*.zdict")), key=os.path.getmtime):
+        with open(path, "rb") as f:
+            dictionary = zstandard.ZstdCompressionDict(f.read())
+        _dictionaries[dictionary.dict_id()] = dictionary
+        newest = dictionary
+    _current_dictionary = newest
+    _local.__dict__.clear()
+
+
+def _compressor():
+    if getattr(_local, "compressor", None) is None:
+        _local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=_current_dictionary)
+    return _local.compressor
+
+
+def _decompressor(dict_id):
+    decompressors = _local.__dict__.setdefault("decompressors", {})
+    if dict_id not in decompressors:
+        if dict_id and dict_id not in _dictionaries:
+            raise RuntimeError(f"zstd dictionary {dict_id} not found in {DICTIONARY_FOLDER}")
+        decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=_dictionaries.get(dict_id))
+    return decompressors[dict_id]
+
+
+def compress_text(value):
+    """Returns bytes for values worth compressing, otherwise the original str."""
+    data = value.encode("utf-8")
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return value
+    if zstandard is not None:
+        return _compressor().compress(data)
+    return ZLIB_PREFIX + zlib.compress(data, 6)
+
+
+def decompress_text(value):
+    """Inverse of compress_text; plain str values pass through unchanged."""
+    if value is None or isinstance(value, str):
+        return value
+    data = bytes(value)
+    if data.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read compressed rows")
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        return _decompressor(dict_id).decompress(data).decode("utf-8")
+    if data.startswith(ZLIB_PREFIX):
+        return zlib.decompress(data[len(ZLIB_PREFIX):]).decode("utf-8")
+    return data.decode("utf-8")
+
+
+def text_prefix(value, chars):
+    """
+    First chars characters of a raw stored value (see raw_text()); compressed values
+    are decompressed only as far as needed instead of in full.
+    """
+    if value is None or isinstance(value, str):
+        return value and value[:chars]
+    data = bytes(value)
+    # UTF-8 needs at most 4 bytes per character
+    if data.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read compressed rows")
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        with _decompressor(dict_id).stream_reader(data) as reader:
+            data = reader.read(chars * 4)
+    elif data.startswith(ZLIB_PREFIX):
+        data = zlib.decompressobj().decompress(data[len(ZLIB_PREFIX):], chars * 4)
+    else:
+        data = data[:chars * 4]
+    return data.decode("utf-8", errors="ignore")[:chars]
+
+
+def raw_text(column):
+    """A CompressedText column selected as stored, without decompressing (for text_prefix())."""
+    return type_coerce(column, Text())
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text column stored zstd-compressed once it reaches COMPRESSION_MIN_BYTES.
+
+    On SQLite the column keeps its TEXT declaration: short values stay TEXT and
+    compressed ones are stored as BLOBs, so existing rows need no rewrite to be read.
+    Other databases store everything as binary.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(Text())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        stored = compress_text(value)
+        if isinstance(stored, str) and dialect.name != "sqlite":
+            return stored.encode("utf-8")
+        return stored
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+
+load_dictionaries()
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+from transformers.modeling_outputs import BaseModelOutput
+
+# Memory budget for cached encoder hidden states (bart-large: ~4 MB per 1024-token chunk)
+ENCODER_CACHE_MAX_MB = int(os.getenv("ENCODER_CACHE_MAX_MB", "256"))
+
+
+def encoder_key(model):
+    """Identifies a model's encoder; models sharing an encoder can share one key via share_encoder()."""
+    return getattr(model, "_summaize_encoder_key", None) or f"encoder-{id(model.get_encoder())}"
+
+
+def share_encoder(key, *models):
+    """Declares that models have identical encoder weights, so they reuse each other's cached outputs."""
+    for model in models:
+        model._summaize_encoder_key = key
+
+
+def share_if_identical(key, first, second):
+    """Shares the cache key when two models' encoder weights are equal (e.g. fine-tuning froze the encoder)."""
+    first_params = dict(first.get_encoder().state_dict())
+    second_params = dict(second.get_encoder().state_dict())
+    if first_params.keys() != second_params.keys():
+        return False
+    if all(torch.equal(first_params[name], second_params[name]) for name in first_params):
+        share_encoder(key, first, second)
+        return True
+    return False
+
+
+class EncoderCache:
+    """
+    LRU of encoder hidden states per (encoder, input ids), bounded by tensor memory.
+
+    Re-summarizing the same chunk with different decoding settings (retries, quality
+    vs fast profiles, test_models) then only repeats decoding.
+    """
+
+    def __init__(self, max_bytes=ENCODER_CACHE_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(model, input_ids):
+        digest = hashlib.sha1(input_ids.detach().cpu().numpy().tobytes()).hexdigest()
+        return encoder_key(model), tuple(input_ids.shape), digest
+
+    def _get(self, key):
+        with self._lock:
+            hidden = self._entries.get(key)
+            if hidden is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return hidden
+
+    def _put(self, key, hidden):
+        size = hidden.element_size() * hidden.nelement()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = hidden
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.element_size() * evicted.nelement()
+
+    def encode(self, model, input_ids, attention_mask=None):
+        """Returns encoder outputs for input_ids (unpadded batch), computing them only on a cache miss."""
+        key = self._key(model, input_ids)
+        hidden = self._get(key)
+        if hidden is None:
+            with torch.no_grad():
+                hidden = model.get_encoder()(
+                    input_ids=input_ids, attention_mask=attention_mask, return_dict=True
+                ).last_hidden_state.detach()
+            self._put(key, hidden)
+        # generate() replaces fields of the output object when expanding for beams, so wrap per call
+        return BaseModelOutput(last_hidden_state=hidden)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "mb": round(self._bytes / (1024 * 1024), 1),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+encoder_cache = EncoderCache()
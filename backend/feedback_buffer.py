@@ -0,0 +1,196 @@
+"""
+Buffered feedback ingestion with incrementally maintained rating aggregates.
+
+submit_feedback only appends to an in-memory buffer; a background thread writes
+the buffer in one transaction every FEEDBACK_FLUSH_INTERVAL_SECONDS, or as soon as
+FEEDBACK_FLUSH_SIZE rows are waiting, and flush() runs again on shutdown. The
+same transaction adds the batch to feedback_stats (count, sum, histogram per user,
+per model and overall) with in-place increments, so /feedback/stats reads a few
+rows instead of scanning feedback.
+"""
+import atexit
+import os
+import threading
+from collections import defaultdict
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from database import SessionLocal
+from models import Feedback, FeedbackStats
+
+# Flush when this many rows are waiting...
+FEEDBACK_FLUSH_SIZE = int(os.getenv("FEEDBACK_FLUSH_SIZE", "50"))
+# ...or at least this often
+FEEDBACK_FLUSH_INTERVAL_SECONDS = float(os.getenv("FEEDBACK_FLUSH_INTERVAL_SECONDS", "2"))
+# Submissions are rejected beyond this backlog (e.g. while the database is unavailable)
+FEEDBACK_MAX_PENDING = int(os.getenv("FEEDBACK_MAX_PENDING", "10000"))
+
+UNKNOWN_MODEL = "unknown"
+
+
+def stats_keys(row):
+    """The feedback_stats rows a feedback row counts towards: overall, its user and its model."""
+    return [("all", ""), ("user", str(row["user_id"])), ("model", row.get("model_used") or UNKNOWN_MODEL)]
+
+
+def apply_to_stats(db, rows):
+    """
+    Adds rows' ratings to feedback_stats with atomic increments (safe across worker
+    processes). A row may carry a "count" standing for that many identical ratings.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        count = row.get("count", 1)
+        for key in stats_keys(row):
+            delta = deltas[key]
+            delta["count"] += count
+            delta["rating_sum"] += row["rating"] * count
+            if 1 <= row["rating"] <= 5:
+                delta[f"rating_{row['rating']}"] += count
+
+    for (scope, key), delta in deltas.items():
+        values = {column: getattr(FeedbackStats, column) + amount for column, amount in delta.items()}
+        result = db.execute(
+            update(FeedbackStats)
+            .where(FeedbackStats.scope == scope, FeedbackStats.key == key)
+            .values(**values)
+        )
+        if result.rowcount == 0:
+            db.execute(insert(FeedbackStats).values(scope=scope, key=key, **delta))
+
+
+class FeedbackBuffer:
+    """Thread-safe buffer of feedback rows, flushed in batches by a lazily started thread."""
+
+    def __init__(self, flush_size=FEEDBACK_FLUSH_SIZE, interval=FEEDBACK_FLUSH_INTERVAL_SECONDS):
+        self.flush_size = flush_size
+        self.interval = interval
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="feedback-flush", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:  # keep the thread alive; the rows are back in the buffer
+                print(f"🚨 Feedback flush thread error: {e}")
+
+    def add(self, user_id, rating, comment, model_used=None):
+        """Queues one feedback row; returns False when the backlog is full."""
+        self._start()
+        with self._lock:
+            if len(self._rows) >= FEEDBACK_MAX_PENDING:
+                return False
+            self._rows.append({"user_id": user_id, "rating": rating, "comment": comment, "model_used": model_used})
+            if len(self._rows) >= self.flush_size:
+                self._wake.set()
+        return True
+
+    def pending(self):
+        with self._lock:
+            return len(self._rows)
+
+    def _write(self, rows):
+        db = SessionLocal()
+        try:
+            db.execute(insert(Feedback), rows)
+            apply_to_stats(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def flush(self):
+        """Writes all buffered rows and their aggregates in one transaction; rows are kept on failure."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+
+            try:
+                self._write(rows)
+            except IntegrityError:
+                # A bad row (e.g. unknown user_id) or another process creating the same stats row:
+                # write rows one by one (twice), dropping those that still fail
+                return self._write_individually(rows)
+            except Exception as e:
+                self._restore(rows, e)
+                return 0
+
+            self.flushed += len(rows)
+            return len(rows)
+
+    def _restore(self, rows, error):
+        """Puts unwritten rows back at the front of the buffer for the next flush."""
+        with self._lock:
+            self._rows[:0] = rows
+        self.failed_flushes += 1
+        print(f"🚨 Error flushing {len(rows)} feedback rows: {error}")
+
+    def _write_individually(self, rows):
+        written = 0
+        for i, row in enumerate(rows):
+            for attempt in range(2):
+                try:
+                    self._write([row])
+                    written += 1
+                    break
+                except IntegrityError as e:
+                    if attempt:
+                        self.dropped += 1
+                        print(f"🚨 Dropping feedback row {row}: {e}")
+                except SQLAlchemyError as e:
+                    # e.g. "database is locked": keep this and the remaining rows for the next flush
+                    self.flushed += written
+                    self._restore(rows[i:], e)
+                    return written
+        self.flushed += written
+        return written
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+        }
+
+
+feedback_buffer = FeedbackBuffer()
+
+
+def rebuild_feedback_stats(engine):
+    """Recomputes feedback_stats from the feedback table (first run, or after manual edits)."""
+    db = SessionLocal(bind=engine)
+    try:
+        db.query(FeedbackStats).delete()
+        query = db.query(Feedback.user_id, Feedback.rating, Feedback.model_used, func.count())
+        rows = [
+            {"user_id": user_id, "rating": rating, "model_used": model_used, "count": count}
+            for user_id, rating, model_used, count
+            in query.group_by(Feedback.user_id, Feedback.rating, Feedback.model_used)
+        ]
+        apply_to_stats(db, rows)
+        db.commit()
+        print(f"✅ Feedback aggregates rebuilt from {sum(row['count'] for row in rows)} rows")
+    finally:
+        db.close()
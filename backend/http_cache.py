@@ -0,0 +1,42 @@
+"""
+ETags and conditional GETs for responses that only change when their inputs do.
+
+ETags are weak (W/"...") so they stay valid when the response is gzip or brotli
+encoded on the way out. Responses are marked "private, no-cache": browsers keep
+the body and revalidate with If-None-Match on every navigation, and a match is
+answered with an empty 304.
+"""
+import hashlib
+import json
+
+from fastapi import Response
+
+import metrics
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts):
+    """Weak ETag over JSON-serializable parts (content hashes, model params, row ids...)."""
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against etag."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def cache_headers(etag):
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL} if etag else {}
+
+
+def not_modified(etag, headers=None):
+    """Empty 304 carrying the validator (and any headers the full response would have had)."""
+    metrics.increment("http_not_modified")
+    return Response(status_code=304, headers={**(headers or {}), **cache_headers(etag)})
@@ -0,0 +1,302 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from fastapi import HTTPException
+
+# Number of worker threads running model inference concurrently
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+
+# Requests waiting beyond this are rejected with 429 instead of piling up
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "8"))
+
+# torch intra-op threads per worker, so workers together don't oversubscribe the CPU
+TORCH_INTRA_OP_THREADS = int(os.getenv(
+    "TORCH_INTRA_OP_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, INFERENCE_WORKERS)))
+))
+
+# Relative throughput share of each priority class when users compete for workers
+PRIORITY_WEIGHTS = {"interactive": 4, "batch": 1}
+
+# Most workers one user may occupy at once (0 = no cap)
+USER_MAX_ACTIVE = int(os.getenv("INFERENCE_USER_MAX_ACTIVE", "0"))
+
+# Queue waits kept per user and priority class for the wait-time percentiles
+WAIT_SAMPLES = 200
+
+# torch inter-op threads (process-wide, set once before any model runs)
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "1"))
+
+# Optional CPU pinning of inference workers: "auto" splits the available cores evenly,
+# or explicit core sets per worker such as "0-3;4-7" (Linux only)
+INFERENCE_CPU_AFFINITY = os.getenv("INFERENCE_CPU_AFFINITY", "")
+
+# PDF text extraction gets its own small pool so uploads don't wait behind summaries
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "2"))
+EXTRACTION_QUEUE_SIZE = int(os.getenv("EXTRACTION_QUEUE_SIZE", "16"))
+
+# bcrypt hashing for register/login runs in a small pool so login bursts can't take every server thread
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", "2"))
+AUTH_QUEUE_SIZE = int(os.getenv("AUTH_QUEUE_SIZE", "64"))
+
+
+def parse_cpu_sets(spec, workers):
+    """Turns an INFERENCE_CPU_AFFINITY value into one core set per worker (None when pinning is off)."""
+    if not spec or not hasattr(os, "sched_setaffinity"):
+        return None
+    if spec == "auto":
+        cores = sorted(os.sched_getaffinity(0))
+        per_worker = max(1, len(cores) // workers)
+        return [set(cores[(i * per_worker) % len(cores):][:per_worker]) for i in range(workers)]
+
+    cpu_sets = []
+    for group in spec.split(";"):
+        cores = set()
+        for part in group.split(","):
+            start, _, end = part.strip().partition("-")
+            cores.update(range(int(start), int(end or start) + 1))
+        cpu_sets.append(cores)
+    return cpu_sets
+
+
+def configure_torch_threads(intra_op_threads=TORCH_INTRA_OP_THREADS, interop_threads=TORCH_INTEROP_THREADS):
+    """
+    Bounds torch threading for this process before models load: inter-op threads are
+    process-wide and can only be set once; intra-op threads here apply to the loading
+    thread, each inference worker sets its own.
+    """
+    import torch
+
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        pass  # already set, or inter-op work already started
+    torch.set_num_threads(intra_op_threads)
+    print(f"✅ torch threads: {intra_op_threads} intra-op per worker, {torch.get_num_interop_threads()} inter-op")
+
+
+_running = threading.local()
+
+
+def current_flow():
+    """The (user_id, priority) flow of the pool job running on this thread, or None."""
+    return getattr(_running, "flow", None)
+
+
+class _Job:
+    __slots__ = ("future", "fn", "args", "kwargs", "flow", "start_tag", "enqueued")
+
+    def __init__(self, future, fn, args, kwargs, flow, start_tag):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.flow = flow
+        self.start_tag = start_tag
+        self.enqueued = time.monotonic()
+
+
+class InferencePool:
+    """
+    Fixed-size pool of worker threads with a bounded, per-user fair queue.
+
+    Handlers await run() so the event loop stays free while blocking torch/PyPDF2
+    code executes; a full queue is reported as HTTP 429. Threads are started lazily
+    on first use so the pool is safe to create before uvicorn forks workers.
+
+    Jobs are queued per (user, priority class) flow and dispatched by start-time fair
+    queuing: each job's tag advances its flow by cost / weight, so a user submitting
+    many (or expensive) jobs only delays their own later jobs, and interactive flows
+    get PRIORITY_WEIGHTS more throughput than batch flows. USER_MAX_ACTIVE caps how
+    many workers one user can occupy at once.
+    """
+
+    def __init__(self, name, workers, queue_size, intra_op_threads=None, cpu_sets=None):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.intra_op_threads = intra_op_threads
+        self.cpu_sets = cpu_sets
+        self._threads = []
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._flows = {}  # (user_id, priority) -> deque of _Job
+        self._finish_tags = {}  # (user_id, priority) -> finish tag of the flow's last queued job
+        self._virtual_time = 0.0
+        self._queued = 0
+        self._user_active = {}
+        self._flow_active = {}  # (user_id, priority) -> jobs running
+        self._waits = {}  # (user_id, priority) -> recent queue waits in seconds
+        self.active = 0
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, args=(i,), name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            print(f"✅ Started {self.name} pool with {self.workers} workers")
+
+    def _next_job(self):
+        """Pops the queued job with the smallest start tag whose user is below the cap (lock held)."""
+        best = None
+        for flow, jobs in self._flows.items():
+            if USER_MAX_ACTIVE and self._user_active.get(flow[0], 0) >= USER_MAX_ACTIVE:
+                continue
+            if best is None or jobs[0].start_tag < self._flows[best][0].start_tag:
+                best = flow
+        if best is None:
+            return None
+        job = self._flows[best].popleft()
+        if not self._flows[best]:
+            del self._flows[best]
+        self._queued -= 1
+        self._virtual_time = max(self._virtual_time, job.start_tag)
+        # An idle flow whose finish tag virtual time has passed would start its next job at
+        # the virtual time anyway, so its tag can go (keeps _finish_tags bounded by active flows).
+        # Once nothing is queued the backlog has ended: virtual time jumps to the last finish tag.
+        if not self._flows:
+            self._virtual_time = max([self._virtual_time, *self._finish_tags.values()])
+            self._finish_tags.clear()
+        else:
+            for flow in [f for f, tag in self._finish_tags.items() if tag <= self._virtual_time and f not in self._flows]:
+                del self._finish_tags[flow]
+        return job
+
+    def _worker(self, index):
+        if self.cpu_sets:
+            # Pins this thread; torch's intra-op threads started from it inherit the mask
+            os.sched_setaffinity(0, self.cpu_sets[index % len(self.cpu_sets)])
+        if self.intra_op_threads:
+            import torch
+            torch.set_num_threads(self.intra_op_threads)
+
+        while True:
+            with self._ready:
+                job = self._next_job()
+                while job is None:
+                    self._ready.wait()
+                    job = self._next_job()
+                user_id = job.flow[0]
+                self._user_active[user_id] = self._user_active.get(user_id, 0) + 1
+                self._flow_active[job.flow] = self._flow_active.get(job.flow, 0) + 1
+                self._waits.setdefault(job.flow, deque(maxlen=WAIT_SAMPLES)).append(time.monotonic() - job.enqueued)
+                self.active += 1
+            _running.flow = job.flow
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        job.future.set_result(job.fn(*job.args, **job.kwargs))
+                    except BaseException as e:
+                        job.future.set_exception(e)
+            finally:
+                _running.flow = None
+                with self._ready:
+                    self.active -= 1
+                    self._flow_active[job.flow] -= 1
+                    if not self._flow_active[job.flow]:
+                        del self._flow_active[job.flow]
+                    self._user_active[user_id] -= 1
+                    if not self._user_active[user_id]:
+                        del self._user_active[user_id]
+                    # A capped user's next job may be runnable now
+                    self._ready.notify_all()
+
+    def submit(self, fn, *args, user_id=None, priority="interactive", cost=1.0, **kwargs):
+        """
+        Queues fn(*args, **kwargs) for user_id in a priority class and returns a concurrent
+        Future; raises queue.Full when saturated. cost is the job's relative size.
+        """
+        self._start()
+        future = Future()
+        flow = (user_id, priority)
+        with self._ready:
+            if self._queued >= self.queue_size:
+                raise queue.Full
+            start_tag = max(self._virtual_time, self._finish_tags.get(flow, 0.0))
+            self._finish_tags[flow] = start_tag + cost / PRIORITY_WEIGHTS.get(priority, 1)
+            self._flows.setdefault(flow, deque()).append(_Job(future, fn, args, kwargs, flow, start_tag))
+            self._queued += 1
+            self._ready.notify()
+        return future
+
+    async def run(self, fn, *args, user_id=None, priority="interactive", cost=1.0, **kwargs):
+        """Runs fn in the pool and awaits its result, raising HTTP 429 when the queue is full."""
+        try:
+            future = self.submit(fn, *args, user_id=user_id, priority=priority, cost=cost, **kwargs)
+        except queue.Full:
+            print(f"🚦 {self.name} queue full ({self.queue_depth()} waiting), rejecting request")
+            raise HTTPException(
+                status_code=429,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "5"}
+            )
+        return await asyncio.wrap_future(future)
+
+    def queue_depth(self):
+        return self._queued
+
+    def flow_active(self, flow):
+        """Jobs of a (user_id, priority) flow running right now."""
+        with self._lock:
+            return self._flow_active.get(flow, 0)
+
+    def user_queue(self, user_id):
+        """A user's queued jobs with their positions in dispatch order (1 = next), ignoring caps."""
+        with self._lock:
+            pending = sorted(
+                (job for jobs in self._flows.values() for job in jobs), key=lambda job: job.start_tag
+            )
+            positions = [
+                {"position": i + 1, "priority": job.flow[1], "waiting_seconds": round(time.monotonic() - job.enqueued, 2)}
+                for i, job in enumerate(pending) if job.flow[0] == user_id
+            ]
+            return {"user_id": user_id, "active": self._user_active.get(user_id, 0), "queued": positions}
+
+    def wait_stats(self):
+        """p50/p95/max queue wait per user and priority class over the last WAIT_SAMPLES jobs."""
+        with self._lock:
+            samples = {flow: sorted(waits) for flow, waits in self._waits.items()}
+        stats = []
+        for (user_id, priority), waits in samples.items():
+            stats.append({
+                "user_id": user_id,
+                "priority": priority,
+                "jobs": len(waits),
+                "p50_seconds": round(waits[len(waits) // 2], 3),
+                "p95_seconds": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3),
+                "max_seconds": round(waits[-1], 3),
+            })
+        return stats
+
+    def stats(self):
+        with self._lock:
+            users = {}
+            for (user_id, _), jobs in self._flows.items():
+                users.setdefault(user_id, {"queued": 0, "active": 0})["queued"] += len(jobs)
+            for user_id, active in self._user_active.items():
+                users.setdefault(user_id, {"queued": 0, "active": 0})["active"] = active
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "queued": self.queue_depth(),
+            "queue_size": self.queue_size,
+            "intra_op_threads": self.intra_op_threads,
+            "cpu_sets": [sorted(cores) for cores in self.cpu_sets] if self.cpu_sets else None,
+            "user_max_active": USER_MAX_ACTIVE or None,
+            "users": {str(user_id): counts for user_id, counts in users.items()},
+        }
+
+
+inference_pool = InferencePool(
+    "inference", INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, TORCH_INTRA_OP_THREADS,
+    parse_cpu_sets(INFERENCE_CPU_AFFINITY, INFERENCE_WORKERS)
+)
+extraction_pool = InferencePool("extraction", EXTRACTION_WORKERS, EXTRACTION_QUEUE_SIZE)
+auth_pool = InferencePool("auth", AUTH_WORKERS, AUTH_QUEUE_SIZE)
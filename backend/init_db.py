@@ -1,6 +1,8 @@
 from database import engine, Base
-from models import User, PDF, Summarization, Feedback  # No need to import Base again
-from sqlalchemy import inspect
+from models import User, PDF, Summarization, Feedback, FeedbackStats, SUMMARY_EXCERPT_CHARS  # No need to import Base again
+from sqlalchemy import inspect, text
+from search import create_search_index
+from feedback_buffer import rebuild_feedback_stats
 
 def create_tables():
     """Creates all tables in the database."""
@@ -10,6 +12,82 @@ def create_tables():
     except Exception as e:
         print(f"\n❌ Error creating tables: {e}\n")
 
+def add_missing_columns():
+    """Adds (nullable) columns declared on models to tables created before they existed."""
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    print(f"✅ Added column {table.name}.{column.name}")
+
+def upgrade_schema():
+    """Brings databases created by older versions up to the current models (columns, indexes)."""
+    add_missing_columns()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    create_search_index(engine)
+    with engine.connect() as conn:
+        has_stats = conn.execute(text("SELECT 1 FROM feedback_stats LIMIT 1")).first()
+        has_feedback = conn.execute(text("SELECT 1 FROM feedback LIMIT 1")).first()
+    if has_feedback and not has_stats:
+        rebuild_feedback_stats(engine)
+    backfill_summary_excerpts()
+
+def backfill_summary_excerpts(batch_size=500):
+    """Fills summary_excerpt for summaries stored before the column existed (decompresses each once)."""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        filled = 0
+        while True:
+            rows = db.query(Summarization.id, Summarization.summary_text).filter(
+                Summarization.summary_excerpt.is_(None)
+            ).order_by(Summarization.id).limit(batch_size).all()
+            if not rows:
+                break
+            db.bulk_update_mappings(Summarization, [
+                {"id": summary_id, "summary_excerpt": (summary_text or "")[:SUMMARY_EXCERPT_CHARS]}
+                for summary_id, summary_text in rows
+            ])
+            db.commit()
+            filled += len(rows)
+        if filled:
+            print(f"✅ Summary excerpts backfilled for {filled} rows")
+    finally:
+        db.close()
+
+def backfill_content_hashes(upload_folder="uploads"):
+    """Hashes stored uploads that predate dedup; later copies of the same file keep a NULL hash."""
+    import hashlib
+    import os
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        seen = {h for (h,) in db.query(PDF.content_hash).filter(PDF.content_hash.isnot(None))}
+        for pdf in db.query(PDF).filter(PDF.content_hash.is_(None)).order_by(PDF.id):
+            path = os.path.join(upload_folder, pdf.filename)
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                content_hash = hashlib.sha256(f.read()).hexdigest()
+            if content_hash not in seen:
+                pdf.content_hash = content_hash
+                seen.add(content_hash)
+        db.commit()
+        print(f"✅ Content hashes backfilled ({len(seen)} unique files)")
+    finally:
+        db.close()
+
 def verify_tables():
     """Verifies if tables exist in the database."""
     try:
@@ -24,4 +102,6 @@ def verify_tables():
 
 if __name__ == "__main__":
     create_tables()
+    upgrade_schema()
+    backfill_content_hashes()
     verify_tables()
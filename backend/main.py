@@ -1,14 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from routes import auth, pdf, summary, tables, feedback  # Import feedback route
+from fastapi.responses import RedirectResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from routes import auth, pdf, summary, tables, feedback, profiles, diagnostics, search  # Import feedback route
 from fastapi.staticfiles import StaticFiles
 from database import engine
+from init_db import upgrade_schema
+from feedback_buffer import feedback_buffer
+from checkpoints import purge_stale_checkpoints
 import models
 from fastapi.middleware.cors import CORSMiddleware
+import os
 
+try:
+    from brotli_asgi import BrotliMiddleware  # Optional: brotli for clients that accept it, gzip otherwise
+except ImportError:
+    BrotliMiddleware = None
 
+# JSON bodies smaller than this are sent uncompressed
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # Write buffered feedback before the worker exits
+    feedback_buffer.flush()
 
 # Initialize FastAPI app
-app = FastAPI(title="Summaize API", description="API for PDF Summarization", version="1.0")
+app = FastAPI(title="Summaize API", description="API for PDF Summarization", version="1.0", lifespan=lifespan)
 
 # Serve static files (favicon, images, etc.)
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -23,10 +44,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, OPTIONS, etc.)
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["ETag", "X-Next-Cursor", "X-Profile-Id"],  # Readable by the frontend
 )
 
+# Compress large responses (summary listings, exports)
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_BYTES, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_BYTES)
+
 # Create database tables (if not exists)
 models.Base.metadata.create_all(bind=engine)
+upgrade_schema()
+purge_stale_checkpoints()
 
 # Registering Routers
 app.include_router(auth.router, tags=["Authentication"])
@@ -34,6 +64,9 @@ app.include_router(pdf.router, tags=["PDF Handling"])
 app.include_router(summary.router, tags=["Summarization"])
 app.include_router(tables.router, tags=["Database Tables"])
 app.include_router(feedback.router, tags=["Feedback"])  # ✅ Add Feedback Router
+app.include_router(profiles.router, tags=["Profiling"])
+app.include_router(diagnostics.router, tags=["Diagnostics"])
+app.include_router(search.router, tags=["Search"])
 
 
 # Root Endpoint
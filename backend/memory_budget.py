@@ -0,0 +1,252 @@
+"""
+Memory-budget admission control for summarization.
+
+Each request's peak memory is estimated before it is queued, from token counts,
+batch size, beams and the model's dimensions. Requests are admitted while the
+estimates of in-flight requests fit MEMORY_BUDGET_MB. A request that would not
+fit even on an idle worker runs with a lighter plan: one chunk per batch first,
+then fewer beams. The estimate and the actual peak RSS are recorded for each
+request so MEMORY_ESTIMATE_FACTOR can be tuned.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from fastapi import HTTPException
+
+import metrics
+
+# Memory for in-flight summarization on top of the loaded models, in MB
+# (0 = 70% of the cgroup/host memory limit minus the RSS when the budget is first used)
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "0"))
+
+# Multiplier on the analytic estimate for allocator overhead and temporaries
+MEMORY_ESTIMATE_FACTOR = float(os.getenv("MEMORY_ESTIMATE_FACTOR", "1.5"))
+
+# How long a request waits for budget before it is rejected with 503
+MEMORY_ADMISSION_TIMEOUT = float(os.getenv("MEMORY_ADMISSION_TIMEOUT", "120"))
+
+# Input tokens per word for estimates made before tokenizing (BART BPE on English text)
+TOKENS_PER_WORD = 1.35
+
+# Plans tried in order until the estimate fits the budget: (label, batch size, beam cap)
+PLANS = [
+    ("full", None, None),
+    ("split", 1, None),
+    ("split, 2 beams", 1, 2),
+    ("split, greedy", 1, 1),
+]
+
+MB = 1024 * 1024
+
+
+def current_rss():
+    """Resident set size of this process in bytes (Linux /proc, else the peak from getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def memory_limit():
+    """The cgroup memory limit if one is set, else total host memory, in bytes."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value.isdigit() and int(value) < 1 << 60:
+                return int(value)
+        except OSError:
+            pass
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def estimate_generation_bytes(model, batch_size, input_tokens, num_beams, max_length):
+    """
+    Peak activation memory of one generate() call: the encoder pass (hidden states,
+    attention scores, feed-forward), then decoding with encoder states expanded per
+    beam, cross- and self-attention KV caches and per-step logits.
+    """
+    config = model.config
+    try:
+        element = next(model.parameters()).element_size()
+    except (AttributeError, StopIteration, TypeError):
+        element = 4  # ONNX Runtime sessions run in fp32
+    d_model = config.d_model
+    rows = batch_size * num_beams
+
+    encoder = batch_size * input_tokens * (
+        2 * d_model + config.encoder_ffn_dim + config.encoder_attention_heads * input_tokens
+    )
+    decoder = (
+        rows * input_tokens * d_model                                   # expanded encoder states
+        + 2 * config.decoder_layers * rows * input_tokens * d_model     # cross-attention KV cache
+        + 2 * config.decoder_layers * rows * max_length * d_model       # self-attention KV cache
+        + 3 * rows * config.vocab_size                                  # logits, log-softmax, scores
+    )
+    return int(max(encoder, decoder) * element * MEMORY_ESTIMATE_FACTOR)
+
+
+class MemoryBudget:
+    """Admits requests while the estimated peaks of in-flight requests fit the budget."""
+
+    def __init__(self, budget_mb=MEMORY_BUDGET_MB):
+        self.budget_mb = budget_mb
+        self._budget = None
+        self.reserved = 0
+        self.in_flight = 0
+        self._condition = None
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=100)
+
+    @property
+    def budget(self):
+        if self._budget is None:
+            if self.budget_mb:
+                self._budget = self.budget_mb * MB
+            else:
+                self._budget = max(256 * MB, int(memory_limit() * 0.7) - current_rss())
+            print(f"✅ Summarization memory budget: {self._budget // MB} MB")
+        return self._budget
+
+    def plan(self, estimate):
+        """
+        Picks the first of PLANS whose estimate(batch_size, max_beams) fits the whole
+        budget; returns (label, batch_size, max_beams, estimated bytes). Raises 413
+        when even the lightest plan does not fit.
+        """
+        for label, batch_size, max_beams in PLANS:
+            estimated = estimate(batch_size, max_beams)
+            if estimated <= self.budget:
+                if label != "full":
+                    metrics.increment("memory_downgraded_requests")
+                return label, batch_size, max_beams, estimated
+        raise HTTPException(
+            status_code=413,
+            detail=f"Request needs about {estimated // MB} MB, more than the {self.budget // MB} MB memory budget"
+        )
+
+    @asynccontextmanager
+    async def admit(self, estimated):
+        """Waits until estimated bytes fit next to in-flight requests and holds them for the block."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self.reserved + estimated <= self.budget or not self.in_flight),
+                    MEMORY_ADMISSION_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                metrics.increment("memory_rejected_requests")
+                raise HTTPException(
+                    status_code=503,
+                    detail="Not enough memory for this request right now, please retry shortly",
+                    headers={"Retry-After": "10"}
+                )
+            self.reserved += estimated
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.reserved -= estimated
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def run_tracked(self, plan, fn, *args):
+        """Runs fn(*args) under the plan's decoding limits, recording its peak RSS against the estimate."""
+        label, batch_size, max_beams, estimated = plan
+        sampler = RssSampler()
+        sampler.start()
+        try:
+            with decoding_limits(batch_size, max_beams):
+                return fn(*args)
+        finally:
+            sampler.stop()
+            with self._lock:
+                self._records.append({
+                    "plan": label,
+                    "estimated_mb": round(estimated / MB, 1),
+                    "actual_peak_mb": round(sampler.peak_increase / MB, 1),
+                    "concurrent": self.in_flight,
+                    "seconds": round(sampler.elapsed, 2),
+                })
+
+    def stats(self):
+        with self._lock:
+            records = list(self._records)
+        alone = [r for r in records if r["concurrent"] <= 1 and r["estimated_mb"]]
+        return {
+            "budget_mb": round(self.budget / MB, 1),
+            "reserved_mb": round(self.reserved / MB, 1),
+            "in_flight": self.in_flight,
+            "estimate_factor": MEMORY_ESTIMATE_FACTOR,
+            # actual / estimated for requests that ran alone (RSS is per process); < 1 means overestimating
+            "actual_to_estimate": (
+                round(sum(r["actual_peak_mb"] / r["estimated_mb"] for r in alone) / len(alone), 3) if alone else None
+            ),
+            "recent": records[-20:],
+        }
+
+
+class RssSampler(threading.Thread):
+    """Samples this process's RSS while a request runs; peak_increase is relative to the start."""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.baseline = current_rss()
+        self.peak = self.baseline
+        self._stop_event = threading.Event()
+        self._start_time = time.perf_counter()
+        self.elapsed = 0.0
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, current_rss())
+        self.elapsed = time.perf_counter() - self._start_time
+
+    @property
+    def peak_increase(self):
+        return self.peak - self.baseline
+
+
+_local = threading.local()
+
+
+@contextmanager
+def decoding_limits(batch_size=None, max_beams=None):
+    """Caps generation batch size and beams for summaries generated inside the block on this thread."""
+    previous = getattr(_local, "limits", None)
+    _local.limits = (batch_size, max_beams)
+    try:
+        yield
+    finally:
+        _local.limits = previous
+
+
+def current_batch_size():
+    limits = getattr(_local, "limits", None)
+    return limits[0] if limits else None
+
+
+def limit_beams(generate_kwargs):
+    """generate_kwargs with num_beams capped by the enclosing decoding_limits(), if any."""
+    limits = getattr(_local, "limits", None)
+    if not limits or not limits[1] or generate_kwargs.get("num_beams", 1) <= limits[1]:
+        return generate_kwargs
+    return {**generate_kwargs, "num_beams": limits[1]}
+
+
+memory_budget = MemoryBudget()
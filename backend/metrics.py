@@ -0,0 +1,18 @@
+import threading
+from collections import defaultdict
+
+# In-process counters, served by /diagnostics/metrics (per worker process)
+_lock = threading.Lock()
+_counters = defaultdict(int)
+
+
+def increment(name, value=1):
+    """Adds value to the named counter."""
+    with _lock:
+        _counters[name] += value
+
+
+def snapshot():
+    """Returns a copy of all counters."""
+    with _lock:
+        return {"counters": dict(_counters)}
@@ -0,0 +1,108 @@
+"""
+Compresses existing pdfs.text / summarization.summary_text rows in place.
+
+Usage: python migrate_compression.py [--train-dictionary] [--vacuum]
+
+With --train-dictionary a zstd dictionary is trained from a sample of stored
+texts and saved to COMPRESSION_DICTIONARY_FOLDER before rows are rewritten.
+Values shorter than COMPRESSION_MIN_BYTES are left as plain text.
+"""
+import argparse
+import os
+import random
+
+from sqlalchemy import inspect, text
+
+import db_types
+from database import engine
+
+COLUMNS = [("pdfs", "text"), ("summarization", "summary_text")]
+BATCH_SIZE = 200
+
+
+def train_dictionary(engine, size=112640, samples=2000):
+    """Trains a zstd dictionary from stored texts and makes it the current one."""
+    if db_types.zstandard is None:
+        print("⚠️ zstandard is not installed, skipping dictionary training")
+        return None
+
+    corpus = []
+    with engine.connect() as conn:
+        for table, column in COLUMNS:
+            rows = conn.execute(text(f"SELECT {column} FROM {table}")).fetchall()
+            corpus += [db_types.decompress_text(row[0]).encode("utf-8") for row in rows if row[0]]
+    random.shuffle(corpus)
+    corpus = corpus[:samples]
+    if len(corpus) < 8:
+        print(f"⚠️ Only {len(corpus)} samples, not enough to train a dictionary")
+        return None
+
+    dictionary = db_types.zstandard.train_dictionary(size, corpus)
+    os.makedirs(db_types.DICTIONARY_FOLDER, exist_ok=True)
+    path = os.path.join(db_types.DICTIONARY_FOLDER, f"{dictionary.dict_id()}.zdict")
+    with open(path, "wb") as f:
+        f.write(dictionary.as_bytes())
+    db_types.load_dictionaries()
+    print(f"✅ Trained dictionary {path} from {len(corpus)} samples")
+    return path
+
+
+def _is_compressed(value):
+    return not isinstance(value, str) and bytes(value[:4]).startswith((db_types.ZSTD_MAGIC, db_types.ZLIB_PREFIX))
+
+
+def migrate(engine):
+    """Rewrites rows that are still stored as plain text but are large enough to compress."""
+    if engine.dialect.name == "postgresql":
+        # CompressedText is bytea outside SQLite
+        inspector = inspect(engine)
+        with engine.begin() as conn:
+            for table, column in COLUMNS:
+                column_type = next(c["type"] for c in inspector.get_columns(table) if c["name"] == column)
+                if "BYTEA" in str(column_type).upper():
+                    continue
+                conn.execute(text(
+                    f"ALTER TABLE {table} ALTER COLUMN {column} TYPE bytea USING convert_to({column}, 'UTF8')"
+                ))
+
+    total = 0
+    for table, column in COLUMNS:
+        last_id = 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(text(
+                    f"SELECT id, {column} FROM {table} WHERE id > :last_id ORDER BY id LIMIT :limit"
+                ), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+                for row_id, value in rows:
+                    if value is None or _is_compressed(value):
+                        continue
+                    stored = db_types.compress_text(db_types.decompress_text(value))
+                    if isinstance(stored, bytes):
+                        conn.execute(text(f"UPDATE {table} SET {column} = :value WHERE id = :id"),
+                                     {"value": stored, "id": row_id})
+                        total += 1
+            if len(rows) < BATCH_SIZE:
+                break
+            last_id = rows[-1][0]
+    print(f"✅ Compressed {total} rows")
+    return total
+
+
+def vacuum(engine):
+    """Reclaims the space freed by compression (SQLite)."""
+    if engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-dictionary", action="store_true")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the database file")
+    args = parser.parse_args()
+
+    if args.train_dictionary:
+        train_dictionary(engine)
+    migrate(engine)
+    if args.vacuum:
+        vacuum(engine)
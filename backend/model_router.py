@@ -0,0 +1,30 @@
+import os
+
+# Documents below this many words count as short (same threshold as summarize_with_fine_tuned)
+SHORT_DOCUMENT_WORDS = 2000
+
+# With this many summaries already waiting, "balanced" requests move to the lighter tier
+ROUTER_BUSY_QUEUE_DEPTH = int(os.getenv("ROUTER_BUSY_QUEUE_DEPTH", "4"))
+
+PROFILES = ("quality", "balanced", "fast")
+
+
+def choose_tier(word_count, profile, queue_depth, available_tiers):
+    """
+    Picks the model tier for model_type="auto" requests; returns (tier, reason).
+
+    "quality" always uses BART-large, "fast" the distilled tier, and "balanced" sends
+    short documents, or everything while the inference queue is busy, to the
+    distilled tier.
+    """
+    if "distilled" not in available_tiers:
+        return "pretrained", "no distilled tier registered"
+    if profile == "quality":
+        return "pretrained", "quality profile"
+    if profile == "fast":
+        return "distilled", "fast profile"
+    if word_count < SHORT_DOCUMENT_WORDS:
+        return "distilled", f"short document ({word_count} words)"
+    if queue_depth >= ROUTER_BUSY_QUEUE_DEPTH:
+        return "distilled", f"high load ({queue_depth} queued)"
+    return "pretrained", f"long document ({word_count} words)"
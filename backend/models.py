@@ -1,6 +1,10 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Index, DateTime, func, event
 from sqlalchemy.orm import relationship
 from database import Base
+from db_types import CompressedText
+
+# Leading characters of each summary kept uncompressed for listings with excerpt_chars
+SUMMARY_EXCERPT_CHARS = 500
 
 # ✅ Users Table
 class User(Base):
@@ -23,7 +27,8 @@ class PDF(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=True)  # ✅ Nullable for guest uploads
     filename = Column(String, nullable=False)
-    text = Column(String, nullable=False)  # ✅ Ensure this column exists
+    text = Column(CompressedText, nullable=False)  # ✅ Ensure this column exists (compressed when large)
+    content_hash = Column(String(64), unique=True, index=True, nullable=True)  # ✅ SHA-256 of the file, for dedup
     
     # ✅ Relationship
     user = relationship("User", back_populates="pdfs", passive_deletes=True)
@@ -36,12 +41,22 @@ class Summarization(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
     pdf_id = Column(Integer, ForeignKey("pdfs.id", ondelete="CASCADE"), index=True, nullable=False)
-    summary_text = Column(Text, nullable=False)
+    summary_text = Column(CompressedText, nullable=False)
+    summary_excerpt = Column(Text, nullable=True)  # ✅ Plain first SUMMARY_EXCERPT_CHARS, readable with SQL substr
 
     # ✅ Relationships
     user = relationship("User", back_populates="summaries", passive_deletes=True)
     pdf = relationship("PDF", back_populates="summaries", passive_deletes=True)
 
+    # ✅ Per-user listing and per-user/per-document lookups
+    __table_args__ = (Index("ix_summarization_user_pdf", "user_id", "pdf_id"),)
+
+@event.listens_for(Summarization, "before_insert")
+@event.listens_for(Summarization, "before_update")
+def _set_summary_excerpt(mapper, connection, target):
+    if target.summary_text is not None:
+        target.summary_excerpt = target.summary_text[:SUMMARY_EXCERPT_CHARS]
+
 # ✅ Feedback Table (Updated to Match Schema)
 class Feedback(Base):
     __tablename__ = "feedback"
@@ -50,6 +65,31 @@ class Feedback(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)  # ✅ Linked to user
     rating = Column(Integer, nullable=False)  # ✅ Stores rating (1-5)
     comment = Column(Text, nullable=False)  # ✅  comment
+    model_used = Column(String(32), nullable=True)  # ✅ Model whose summary was rated, if known
 
     # ✅ Relationships
     user = relationship("User", back_populates="feedbacks", passive_deletes=True)
+
+# ✅ Rating aggregates, maintained by feedback_buffer (scope "all", "user" or "model")
+class FeedbackStats(Base):
+    __tablename__ = "feedback_stats"
+
+    scope = Column(String(8), primary_key=True)
+    key = Column(String(64), primary_key=True)  # user id or model name ("" for scope "all")
+    count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_1 = Column(Integer, nullable=False, default=0)
+    rating_2 = Column(Integer, nullable=False, default=0)
+    rating_3 = Column(Integer, nullable=False, default=0)
+    rating_4 = Column(Integer, nullable=False, default=0)
+    rating_5 = Column(Integer, nullable=False, default=0)
+
+# ✅ Completed chunk summaries of in-progress summarizations, so a retry after a crash resumes
+class SummaryCheckpoint(Base):
+    __tablename__ = "summary_checkpoints"
+
+    run_key = Column(String(64), primary_key=True)  # hash of the input text, model and generation settings
+    position = Column(Integer, primary_key=True)  # chunk index within the run
+    level = Column(Integer, nullable=False)  # 1 = document chunks, 2+ = levels of a cross-document summary
+    summary_text = Column(CompressedText, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)
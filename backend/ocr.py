@@ -0,0 +1,201 @@
+"""
+OCR fallback for scanned PDFs.
+
+Pages whose PyPDF2 text layer is (almost) empty are rasterized with PyMuPDF and
+OCRed with a local Tesseract install in a process pool, one page per task. OCR
+text is cached on disk by a hash of the rendered page image, so re-uploads and
+repeated pages (cover sheets, forms) are not OCRed twice. Page texts are merged
+back in page order with the text-layer pages.
+
+PyMuPDF (pip install pymupdf) and pytesseract plus the tesseract binary are
+optional; without them scanned pages simply yield no text.
+"""
+import functools
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PyPDF2 import PdfReader
+
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:
+    pytesseract = None
+
+import metrics
+
+# Pages with fewer text-layer characters than this are OCRed
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "10"))
+
+# Processes OCRing pages in parallel (0 = OCR disabled)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Rasterization resolution; Tesseract is most accurate around 300 DPI
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+
+# Tesseract language(s), e.g. "eng" or "eng+deu"
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+
+# Seconds Tesseract may spend on one page before it is skipped
+OCR_PAGE_TIMEOUT = int(os.getenv("OCR_PAGE_TIMEOUT", "60"))
+
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "ocr_cache")
+
+
+@functools.lru_cache(maxsize=None)
+def ocr_available():
+    """True when PyMuPDF, pytesseract and the tesseract binary are all installed (checked once per process)."""
+    if pymupdf is None or pytesseract is None or OCR_WORKERS <= 0:
+        return False
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception:
+        return False
+    return True
+
+
+def _cache_path(image_hash):
+    return os.path.join(OCR_CACHE_DIR, image_hash[:2], f"{image_hash}.txt")
+
+
+def ocr_page(path, page_number):
+    """
+    Rasterizes and OCRs one page (runs in an OCR worker process). Returns
+    (text, timing) where timing has render_ms, ocr_ms and whether the cache hit.
+    """
+    start = time.perf_counter()
+    with pymupdf.open(path) as document:
+        pixmap = document[page_number].get_pixmap(dpi=OCR_DPI, colorspace=pymupdf.csGRAY)
+    image_hash = hashlib.sha256(
+        f"{pixmap.width}x{pixmap.height}:{OCR_LANG}:".encode() + pixmap.samples
+    ).hexdigest()
+    rendered = time.perf_counter()
+    timing = {"page": page_number + 1, "render_ms": round((rendered - start) * 1000, 1)}
+
+    cache_path = _cache_path(image_hash)
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            return f.read(), {**timing, "ocr_ms": 0.0, "cached": True}
+
+    image = Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+    try:
+        text = pytesseract.image_to_string(image, lang=OCR_LANG, timeout=OCR_PAGE_TIMEOUT)
+    except Exception as e:
+        if type(e) is RuntimeError and "timeout" in str(e):
+            return "", {**timing, "ocr_ms": round((time.perf_counter() - rendered) * 1000, 1), "cached": False,
+                        "timed_out": True}
+        # pytesseract's own exception types don't unpickle in the server process
+        raise RuntimeError(f"Tesseract failed: {e}") from None
+    timing = {**timing, "ocr_ms": round((time.perf_counter() - rendered) * 1000, 1), "cached": False}
+
+    # Write then rename so concurrent workers never read a partial file
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, cache_path)
+    return text, timing
+
+
+class OcrStats:
+    """Per-page OCR timings of recent uploads, for budgeting OCR capacity."""
+
+    def __init__(self, maxlen=500):
+        self._lock = threading.Lock()
+        self._pages = deque(maxlen=maxlen)
+        self.documents = 0
+
+    def record(self, timings):
+        with self._lock:
+            self.documents += 1
+            self._pages.extend(timings)
+
+    def stats(self):
+        with self._lock:
+            pages = list(self._pages)
+        ocred = sorted(t["render_ms"] + t["ocr_ms"] for t in pages if not t["cached"])
+
+        def percentile(fraction):
+            return ocred[min(len(ocred) - 1, int(len(ocred) * fraction))] if ocred else None
+
+        return {
+            "available": ocr_available(),
+            "workers": OCR_WORKERS,
+            "dpi": OCR_DPI,
+            "documents": self.documents,
+            "pages": len(pages),
+            "cache_hits": sum(1 for t in pages if t["cached"]),
+            "page_ms_p50": percentile(0.5),
+            "page_ms_p95": percentile(0.95),
+            "page_ms_max": ocred[-1] if ocred else None,
+        }
+
+
+ocr_stats = OcrStats()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _ocr_executor():
+    """The OCR process pool, created on first use ("spawn": the server process runs threads and torch)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            print(f"✅ Started OCR pool with {OCR_WORKERS} processes")
+        return _executor
+
+
+def _reset_executor(broken):
+    """Drops a pool whose worker died (e.g. killed for memory) so the next upload starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def extract_text(path):
+    """
+    Extracts a PDF's text: the text layer where a page has one, OCR for the other
+    pages (in parallel). Returns (text, timings) with one timing dict per OCRed page.
+    """
+    page_texts = [page.extract_text() or "" for page in PdfReader(path).pages]
+    missing = [i for i, text in enumerate(page_texts) if len(text.strip()) < OCR_MIN_PAGE_CHARS]
+    if not missing or not ocr_available():
+        return "\n".join(page_texts), []
+
+    print(f"🔍 OCR for {len(missing)} of {len(page_texts)} pages without a text layer")
+    executor = _ocr_executor()
+    futures = {i: executor.submit(ocr_page, path, i) for i in missing}
+    timings = []
+    for i, future in futures.items():
+        try:
+            text, timing = future.result()
+        except BrokenProcessPool as e:
+            _reset_executor(executor)
+            print(f"🚨 OCR failed for page {i + 1}: {e}")
+            continue
+        except Exception as e:
+            print(f"🚨 OCR failed for page {i + 1}: {e}")
+            continue
+        if text.strip():
+            page_texts[i] = text
+        timings.append(timing)
+
+    ocr_stats.record(timings)
+    metrics.increment("ocr_pages", len(timings))
+    metrics.increment("ocr_cache_hits", sum(1 for t in timings if t["cached"]))
+    return "\n".join(page_texts), timings
@@ -0,0 +1,60 @@
+"""
+ONNX Runtime inference backend for the BART summarizers.
+
+Export once:   python onnx_backend.py ./bart_model ./fine_tuned_bart
+Then run the API with INFERENCE_BACKEND=onnx. Models without an export (or
+without optimum/onnxruntime installed) fall back to torch.
+"""
+import os
+import sys
+
+# "torch" (default) or "onnx"
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+
+# Threads per ONNX Runtime session (defaults to the torch per-worker setting)
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", os.getenv("TORCH_INTRA_OP_THREADS", "0")))
+
+
+def onnx_path(model_path):
+    """Directory holding the ONNX export of model_path (encoder, decoder, decoder with past)."""
+    return os.path.normpath(model_path) + "_onnx"
+
+
+def export_onnx(model_path, output_dir=None):
+    """Exports a BART checkpoint to ONNX: encoder, decoder and decoder-with-past graphs."""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    output_dir = output_dir or onnx_path(model_path)
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_path, export=True, use_cache=True)
+    model.save_pretrained(output_dir)
+    print(f"✅ Exported {model_path} to {output_dir}")
+    return output_dir
+
+
+def load_onnx_model(model_path, use_cuda=False):
+    """Loads the ONNX export of model_path with all graph optimizations enabled."""
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    export_dir = onnx_path(model_path)
+    if not os.path.isdir(export_dir):
+        raise FileNotFoundError(f"No ONNX export at {export_dir}, run: python onnx_backend.py {model_path}")
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if ORT_INTRA_OP_THREADS:
+        session_options.intra_op_num_threads = ORT_INTRA_OP_THREADS
+
+    model = ORTModelForSeq2SeqLM.from_pretrained(
+        export_dir,
+        use_cache=True,
+        session_options=session_options,
+        provider="CUDAExecutionProvider" if use_cuda else "CPUExecutionProvider",
+    )
+    print(f"Loaded ONNX Runtime model from {export_dir}")
+    return model
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:] or ["./bart_model", "./fine_tuned_bart"]:
+        export_onnx(path)
@@ -0,0 +1,199 @@
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+# Profiles are written here and served back by routes/profiles.py
+PROFILE_FOLDER = "profiles"
+os.makedirs(PROFILE_FOLDER, exist_ok=True)  # Ensure the folder exists
+
+# Admin token guarding on-demand profiling and profile downloads (unset = disabled)
+ADMIN_TOKEN = os.getenv("SUMMAIZE_ADMIN_TOKEN", "")
+
+# Requests slower than this are captured automatically (0 = disabled)
+SLOW_REQUEST_SECONDS = float(os.getenv("PROFILE_SLOW_REQUEST_SECONDS", "0"))
+
+# Stack sampling interval for the CPU profile
+SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_SECONDS", "0.01"))
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """Checks a request's admin token against SUMMAIZE_ADMIN_TOKEN."""
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency rejecting requests without a valid X-Admin-Token header."""
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def profiling_requested(x_profile: Optional[str], profile_query: bool, x_admin_token: Optional[str]) -> bool:
+    """Returns True when a request opts into profiling (header or query flag) as an admin."""
+    wanted = profile_query or (x_profile or "").lower() in ("1", "true", "yes")
+    if wanted and not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Profiling requires an admin token")
+    return wanted
+
+
+class StackSampler(threading.Thread):
+    """Samples the Python stack of one thread at a fixed interval (collapsed-stack output)."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL_SECONDS):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        """Returns the samples in flamegraph.pl / speedscope collapsed format."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+
+class ProfileCapture:
+    """Result handle for profile_request; profile_id is set once a profile was stored."""
+
+    def __init__(self, label):
+        self.label = label
+        self.profile_id = None
+        self.elapsed = None
+
+
+# torch's profiler is process-wide, so only one request at a time gets an op-level profile
+_torch_profiler_lock = threading.Lock()
+
+
+def _start_torch_profiler():
+    """Starts the torch profiler, or returns None (torch missing, another capture running, start failed)."""
+    try:
+        from torch.profiler import profile, ProfilerActivity
+    except ImportError:
+        return None
+    if not _torch_profiler_lock.acquire(blocking=False):
+        print("⚠️ torch profiler busy with another request, capturing the stack sampler only")
+        return None
+    activities = [ProfilerActivity.CPU]
+    try:
+        import torch
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        prof = profile(activities=activities, record_shapes=True)
+        prof.__enter__()
+    except Exception as e:
+        _torch_profiler_lock.release()
+        print(f"⚠️ Could not start torch profiler: {e}")
+        return None
+    return prof
+
+
+def _stop_torch_profiler(prof):
+    """Stops a profiler from _start_torch_profiler(); returns it, or None when stopping failed."""
+    try:
+        prof.__exit__(None, None, None)
+        return prof
+    except Exception as e:
+        print(f"⚠️ Could not stop torch profiler: {e}")
+        return None
+    finally:
+        _torch_profiler_lock.release()
+
+
+def _save_profile(capture, trigger, sampler, torch_prof):
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}_{capture.label}_{uuid.uuid4().hex[:8]}"
+    base = os.path.join(PROFILE_FOLDER, profile_id)
+
+    with open(f"{base}.collapsed", "w") as f:
+        f.write(sampler.collapsed())
+
+    files = [f"{profile_id}.collapsed"]
+    if torch_prof is not None:
+        torch_prof.export_chrome_trace(f"{base}.torch.json")
+        with open(f"{base}.torch.txt", "w") as f:
+            f.write(torch_prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=50))
+        files += [f"{profile_id}.torch.json", f"{profile_id}.torch.txt"]
+
+    with open(f"{base}.meta.json", "w") as f:
+        json.dump({
+            "profile_id": profile_id,
+            "label": capture.label,
+            "trigger": trigger,
+            "elapsed_seconds": round(capture.elapsed, 3),
+            "samples": sampler.samples,
+            "sample_interval_seconds": sampler.interval,
+            "files": files,
+        }, f, indent=2)
+
+    capture.profile_id = profile_id
+    print(f"🧪 Stored {trigger} profile {profile_id} ({capture.elapsed:.1f}s)")
+
+
+@contextmanager
+def profile_request(label, enabled=False):
+    """
+    Profiles the enclosed block on the calling thread.
+
+    With enabled=True a stack-sampled CPU profile and a torch op-level profile are
+    stored (stack samples only while another request holds the torch profiler). Otherwise, if PROFILE_SLOW_REQUEST_SECONDS is set, only the (cheap) stack
+    sampler runs and its profile is kept when the block exceeds the threshold.
+    The enclosed code runs unchanged either way.
+    """
+    capture = ProfileCapture(label)
+    if not enabled and SLOW_REQUEST_SECONDS <= 0:
+        yield capture
+        return
+
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    torch_prof = _start_torch_profiler() if enabled else None
+    start = time.perf_counter()
+    try:
+        yield capture
+    finally:
+        capture.elapsed = time.perf_counter() - start
+        sampler.stop()
+        if torch_prof is not None:
+            torch_prof = _stop_torch_profiler(torch_prof)
+
+        trigger = "requested" if enabled else ("slow" if capture.elapsed >= SLOW_REQUEST_SECONDS else None)
+        if trigger:
+            try:
+                _save_profile(capture, trigger, sampler, torch_prof)
+            except Exception as e:
+                print(f"🚨 Error storing profile: {e}")
+
+
+def list_profiles():
+    """Returns metadata of stored profiles, newest first."""
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_FOLDER), reverse=True):
+        if name.endswith(".meta.json"):
+            with open(os.path.join(PROFILE_FOLDER, name)) as f:
+                profiles.append(json.load(f))
+    return profiles
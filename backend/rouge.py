@@ -1,4 +1,5 @@
 import os
+import time
 import torch
 from transformers import BartForConditionalGeneration, BartTokenizer
 from rouge_score import rouge_scorer
@@ -60,8 +61,11 @@ def summarize_text(text, model, tokenizer, device, max_length=200, min_length=50
         logger.error(f"Error during summarization: {str(e)}")
         raise
 
-def evaluate_model(model_path, texts, reference_summaries):
-    """Evaluate a model on multiple text samples and calculate average ROUGE scores."""
+def evaluate_model(model_path, texts, reference_summaries, latencies=None):
+    """Evaluate a model on multiple text samples and calculate average ROUGE scores.
+
+    If a latencies list is passed, the per-sample generation time (seconds) is appended to it.
+    """
     model, tokenizer, device = load_model_and_tokenizer(model_path)
     
     # Initialize ROUGE scorer
@@ -73,7 +77,10 @@ def evaluate_model(model_path, texts, reference_summaries):
         logger.info(f"Processing sample {i+1}/{len(texts)}")
         
         # Generate summary
+        start = time.perf_counter()
         generated_summary = summarize_text(text, model, tokenizer, device)
+        if latencies is not None:
+            latencies.append(time.perf_counter() - start)
         logger.info(f"Generated summary: {generated_summary}")
         
         # Calculate ROUGE scores
@@ -98,6 +105,19 @@ def evaluate_model(model_path, texts, reference_summaries):
     
     return avg_scores
 
+def evaluate_tiers(tier_paths, texts, reference_summaries):
+    """Evaluate each model tier and return {tier: (avg_scores, avg_latency_seconds)}."""
+    results = {}
+    for tier, model_path in tier_paths.items():
+        logger.info(f"\nEvaluating {tier} tier ({model_path})...\n")
+        try:
+            latencies = []
+            scores = evaluate_model(model_path, texts, reference_summaries, latencies)
+            results[tier] = (scores, sum(latencies) / len(latencies))
+        except Exception as e:
+            logger.error(f"Error evaluating {tier} tier: {str(e)}")
+    return results
+
 if __name__ == "__main__":
     # Path to your offline fine-tuned model
     fine_tuned_model_path = r"D:/SummAIze/backend/fine_tuned_bart_multinews"
@@ -114,30 +134,32 @@ if __name__ == "__main__":
         "Global leaders have agreed to cut carbon emissions to limit temperature rise to 1.5°C. The deal follows years of negotiation, but critics warn of weak enforcement. Developing nations argue wealthier countries should contribute more. Environmentalists call it a crucial step for climate action."
     ]
     
-    # Evaluate fine-tuned model
-    logger.info("Evaluating fine-tuned BART model...")
-    fine_tuned_scores = evaluate_model(fine_tuned_model_path, texts, reference_summaries)
-    
-    # Print average scores for fine-tuned model
-    logger.info("\n===== Fine-tuned BART Model Average ROUGE Scores =====\n")
-    for metric, (precision, recall, f1) in fine_tuned_scores.items():
-        logger.info(f"{metric.upper()}: Precision: {precision:.4f}, Recall: {recall:.4f}, F1: {f1:.4f}")
-    
-    # Evaluate base model if needed
-    try:
-        logger.info("\nEvaluating base BART model...\n\n")
-        base_scores = evaluate_model(base_model_path, texts, reference_summaries)
-        
-        # Print average scores for base model
-        logger.info("\n===== Base BART Model Average ROUGE Scores =====")
-        for metric, (precision, recall, f1) in base_scores.items():
+    # Every tier is evaluated once; the per-model reports and the comparison reuse these results
+    tier_paths = {
+        "pretrained": base_model_path,
+        "fine-tuned": fine_tuned_model_path,
+        "distilled": os.getenv("DISTILLED_MODEL_PATH", r"D:/SummAIze/backend/distilbart_model"),
+    }
+    tier_results = evaluate_tiers(tier_paths, texts, reference_summaries)
+
+    for tier, (scores, _) in tier_results.items():
+        logger.info(f"\n===== {tier} BART Model Average ROUGE Scores =====\n")
+        for metric, (precision, recall, f1) in scores.items():
             logger.info(f"{metric.upper()}: Precision: {precision:.4f}, Recall: {recall:.4f}, F1: {f1:.4f}")
-        
-        # Compare models
+
+    # Compare models
+    if "fine-tuned" in tier_results and "pretrained" in tier_results:
+        fine_tuned_scores, base_scores = tier_results["fine-tuned"][0], tier_results["pretrained"][0]
         logger.info("\n===== Model Comparison (F1 Score Difference) =====")
         for metric in fine_tuned_scores.keys():
             diff = fine_tuned_scores[metric][2] - base_scores[metric][2]
             logger.info(f"{metric.upper()}: {diff:.4f} ({'better' if diff > 0 else 'worse'} than base model)")
-    except Exception as e:
-        logger.error(f"Error evaluating base model: {str(e)}")
-        logger.info("Skipping base model evaluation.")
+    else:
+        logger.info("Skipping model comparison.")
+
+    # Per-tier latency and quality. Summaries come from summarize_text() above (single
+    # 1024-token input, 4 beams), not the app's chunked pipeline in routes/summary.py
+    logger.info("\n===== Model Tiers: Latency and ROUGE F1 (rouge.py summarize_text settings, not the app pipeline) =====")
+    for tier, (scores, latency) in tier_results.items():
+        f1_scores = ", ".join(f"{metric.upper()}: {scores[metric][2]:.4f}" for metric in scores)
+        logger.info(f"{tier}: {latency:.2f}s per sample, {f1_scores}")
@@ -1,7 +1,14 @@
+import os
+import threading
+import time
+from collections import OrderedDict
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from database import get_db
+from inference import auth_pool
 from schemas import UserCreate, UserResponse, LoginRequest
 import models
 from passlib.context import CryptContext
@@ -21,6 +28,63 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60  # Token expires in 1 hour
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# Verified tokens are cached with their user this long (0 disables the cache)
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+
+class UserCache:
+    """
+    LRU of verified tokens -> user, each entry valid for AUTH_CACHE_TTL_SECONDS or
+    until the token expires. Entries of a user are dropped when the row changes in
+    this process; other worker processes pick up changes when their entries expire.
+    """
+
+    def __init__(self, ttl=AUTH_CACHE_TTL_SECONDS, max_entries=AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= time.time():
+                self._entries.pop(token, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token, user, token_expires):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (user, min(time.time() + self.ttl, token_expires))
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *emails):
+        with self._lock:
+            for token in [t for t, (user, _) in self._entries.items() if user.email in emails]:
+                del self._entries[token]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "ttl_seconds": self.ttl, "hits": self.hits, "misses": self.misses}
+
+user_cache = UserCache()
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    """Drops cached tokens of a changed or deleted user (under its old email too, if it changed)."""
+    history = inspect(target).attrs.email.history
+    user_cache.invalidate(target.email, *(history.deleted or ()))
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """Generates JWT access token"""
     to_encode = data.copy()
@@ -36,29 +100,57 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a password against its hashed version."""
     return pwd_context.verify(plain_password, hashed_password)
 
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserResponse:
+    """Dependency resolving the bearer token to its user, via user_cache when possible."""
+    user = user_cache.get(token)
+    if user is not None:
+        return user
+
+    credentials_error = HTTPException(
+        status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"}
+    )
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        raise credentials_error
+
+    db_user = db.query(models.User).filter(models.User.email == payload.get("sub")).first()
+    if db_user is None:
+        raise credentials_error
+
+    # Detached snapshot, safe to share between requests
+    user = UserResponse.model_validate(db_user)
+    user_cache.put(token, user, payload["exp"])
+    return user
+
 # Register a new user
 @router.post("/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     """Registers a new user with a hashed password."""
     
     # Check if username OR email already exists
-    existing_user = db.query(models.User).filter(
-        (models.User.username == user.username) | (models.User.email == user.email)
-    ).first()
+    existing_user = await run_in_threadpool(
+        lambda: db.query(models.User).filter(
+            (models.User.username == user.username) | (models.User.email == user.email)
+        ).first()
+    )
 
     if existing_user:
         raise HTTPException(status_code=400, detail="Username or Email already exists")
 
-    # Hash password before saving
-    hashed_pwd = hash_password(user.password)
+    # Hash password before saving (bcrypt runs in the bounded auth pool)
+    hashed_pwd = await auth_pool.run(hash_password, user.password)
 
     # Create a new user object
     new_user = models.User(username=user.username, email=user.email, password=hashed_pwd)
 
-    # Save user to database
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    # Save user to database (off the event loop: a locked SQLite write can wait seconds)
+    def save_user():
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+
+    await run_in_threadpool(save_user)
 
     # Generate JWT token for the new user
     token = create_access_token({"sub": new_user.email})
@@ -74,13 +166,15 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
 
 # Login Route
 @router.post("/login")
-def login_user(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login_user(login_data: LoginRequest, db: Session = Depends(get_db)):
     """Authenticates a user with email and password and returns a JWT token."""
     
     # Check if user exists
-    user = db.query(models.User).filter(models.User.email == login_data.email).first()
+    user = await run_in_threadpool(
+        lambda: db.query(models.User).filter(models.User.email == login_data.email).first()
+    )
 
-    if not user or not verify_password(login_data.password, user.password):
+    if not user or not await auth_pool.run(verify_password, login_data.password, user.password):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     # Generate JWT token
@@ -94,6 +188,11 @@ def login_user(login_data: LoginRequest, db: Session = Depends(get_db)):
         "token": token
     }
 
+@router.get("/me", response_model=UserResponse)
+def read_current_user(current_user: UserResponse = Depends(get_current_user)):
+    """Returns the user the bearer token belongs to."""
+    return current_user
+
 # Test route for debugging
 @router.get("/test")
 def test_auth():
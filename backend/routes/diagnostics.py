@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends
+from inference import inference_pool, extraction_pool, auth_pool
+from shared_weights import memory_report
+from tokenization import token_cache
+from encoder_cache import encoder_cache
+from batching import generation_batcher
+from memory_budget import memory_budget
+from routes.auth import user_cache
+from feedback_buffer import feedback_buffer
+from ocr import ocr_stats
+from profiling import require_admin
+import metrics
+
+# Admin only (X-Admin-Token, as for /profiles): the reports include per-user queue data
+router = APIRouter(prefix="/diagnostics", tags=["Diagnostics"], dependencies=[Depends(require_admin)])
+
+@router.get("/memory")
+def get_memory():
+    """Reports this worker's RSS vs. memory shared with other workers (e.g. mapped model weights)."""
+    return memory_report()
+
+@router.get("/memory-budget")
+def get_memory_budget():
+    """Reports the summarization memory budget, reservations and estimated vs. actual peak RSS per request."""
+    return memory_budget.stats()
+
+@router.get("/pools")
+def get_pools():
+    """Reports inference, extraction and auth pool utilisation for this worker."""
+    return {"inference": inference_pool.stats(), "extraction": extraction_pool.stats(), "auth": auth_pool.stats()}
+
+@router.get("/queue-waits")
+def get_queue_waits():
+    """Reports inference queue wait percentiles per user and priority class (e.g. interactive p95 during batch floods)."""
+    return {"inference": inference_pool.wait_stats()}
+
+@router.get("/metrics")
+def get_metrics():
+    """Reports this worker's counters (e.g. upload dedup hits)."""
+    return metrics.snapshot()
+
+@router.get("/caches")
+def get_caches():
+    """Reports hit rates and sizes of the in-process inference caches."""
+    return {"token_cache": token_cache.stats(), "encoder_cache": encoder_cache.stats(), "user_cache": user_cache.stats()}
+
+@router.get("/batching")
+def get_batching():
+    """Reports batch sizes and padding efficiency of batched generation (vs. batching in arrival order)."""
+    return generation_batcher.stats()
+
+@router.get("/feedback-buffer")
+def get_feedback_buffer():
+    """Reports buffered feedback rows waiting to be written and flush outcomes."""
+    return feedback_buffer.stats()
+
+@router.get("/ocr")
+def get_ocr():
+    """Reports per-page OCR time percentiles (render + Tesseract) and OCR cache hits of recent uploads."""
+    return ocr_stats.stats()
@@ -2,31 +2,54 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, conint
 from sqlalchemy.orm import Session
 from database import get_db
-from models import Feedback
-from typing import Optional
+from models import FeedbackStats
+from typing import Literal, Optional
+from feedback_buffer import feedback_buffer
 
 #router = APIRouter()
 router = APIRouter(prefix="/feedback")
 
+# Model tiers feedback can be given for (anything else is rejected with 422)
+ModelTier = Literal["pretrained", "fine-tuned", "distilled"]
+
 class FeedbackRequest(BaseModel):
     user_id: int
     rating: conint(ge=1, le=5)
     comment: str
+    model_used: Optional[ModelTier] = None  # "model_used" of the rated summary
 @router.post("/submit")
-async def submit_feedback(feedback: FeedbackRequest, db: Session = Depends(get_db)):
-    try:
-        print("Received feedback request:", feedback.dict())  # Debugging
-        new_feedback = Feedback(
-            user_id=feedback.user_id,
-            rating=feedback.rating,
-            comment=feedback.comment
-        )
-        db.add(new_feedback)
-        db.commit()
-        db.refresh(new_feedback)
-        print("Feedback saved successfully:", new_feedback)  # Debugging
-        return {"message": "Feedback submitted successfully", "feedback_id": new_feedback.id}
-    except Exception as e:
-        db.rollback()
-        print(f"🚨 Error inserting feedback: {e}")  # Debugging output
-        raise HTTPException(status_code=500, detail=str(e))
+async def submit_feedback(feedback: FeedbackRequest):
+    """Queues feedback for the next batched write (see feedback_buffer)."""
+    print("Received feedback request:", feedback.dict())  # Debugging
+    if not feedback_buffer.add(feedback.user_id, feedback.rating, feedback.comment, feedback.model_used):
+        print("🚨 Feedback backlog full, rejecting feedback")
+        raise HTTPException(status_code=503, detail="Feedback is temporarily unavailable, please retry shortly")
+    return {"message": "Feedback submitted successfully", "queued": True}
+
+def _stats_entry(row):
+    if row is None:
+        return {"count": 0, "mean": None, "histogram": {str(r): 0 for r in range(1, 6)}}
+    return {
+        "count": row.count,
+        "mean": round(row.rating_sum / row.count, 3) if row.count else None,
+        "histogram": {str(r): getattr(row, f"rating_{r}") for r in range(1, 6)},
+    }
+
+@router.get("/stats")
+def get_feedback_stats(user_id: Optional[int] = None, model_used: Optional[ModelTier] = None, db: Session = Depends(get_db)):
+    """
+    Rating count, mean and histogram overall, per model and, if given, for one user
+    and one model, read from the precomputed feedback_stats rows. Feedback still in
+    the buffer (at most a few seconds old) is reported as pending.
+    """
+    rows = db.query(FeedbackStats).filter(FeedbackStats.scope.in_(["all", "model"])).all()
+    result = {
+        "all": _stats_entry(next((row for row in rows if row.scope == "all"), None)),
+        "models": {row.key: _stats_entry(row) for row in rows if row.scope == "model"},
+        "pending": feedback_buffer.pending(),
+    }
+    if user_id is not None:
+        result["user"] = _stats_entry(db.get(FeedbackStats, ("user", str(user_id))))
+    if model_used is not None:
+        result["model"] = _stats_entry(db.get(FeedbackStats, ("model", model_used)))
+    return result
@@ -1,22 +1,90 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Header, Query, Response
 from sqlalchemy.orm import Session
-from database import get_db
-from models import PDF
-import shutil
+from sqlalchemy.exc import IntegrityError
+from database import get_db, SessionLocal
+from models import PDF, Summarization
+from db_types import raw_text, text_prefix
 import os
 import uuid
-import io
-from PyPDF2 import PdfReader  # ✅ Import for text extraction
+import hashlib
+from typing import Optional
+from ocr import extract_text, ocr_available
+from profiling import profile_request, profiling_requested
+from inference import extraction_pool
+from search import index_pdf
+import metrics
 
 router = APIRouter(prefix="/pdf", tags=["PDF Handling"])
 
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)  # Ensure the folder exists
+COPY_CHUNK_SIZE = 1024 * 1024
+TEXT_PREVIEW_CHARS = 300
+
+def _save_with_hash(file_obj, file_location):
+    """Copies the upload to disk, hashing it on the way; returns the SHA-256 hex digest."""
+    digest = hashlib.sha256()
+    with open(file_location, "wb") as buffer:
+        while chunk := file_obj.read(COPY_CHUNK_SIZE):
+            digest.update(chunk)
+            buffer.write(chunk)
+    return digest.hexdigest()
+
+def _find_duplicate(content_hash):
+    db = SessionLocal()
+    try:
+        return db.query(PDF.id).filter(PDF.content_hash == content_hash).scalar()
+    finally:
+        db.close()
+
+def _save_and_extract(file_obj, file_location, profile_enabled):
+    """
+    Saves the upload to disk and extracts its text (runs on an extraction worker).
+    Returns (content_hash, duplicate_pdf_id, extracted_text, ocr_timings, profile_id);
+    text is not extracted when an identical file was uploaded before.
+    """
+    with profile_request("upload", enabled=profile_enabled) as capture:
+        content_hash = _save_with_hash(file_obj, file_location)
+        duplicate_id = _find_duplicate(content_hash)
+        extracted_text, ocr_timings = None, []
+        if duplicate_id is None:
+            # ✅ Extract text from PDF (OCR for pages without a text layer)
+            extracted_text, ocr_timings = extract_text(file_location)
+    return content_hash, duplicate_id, extracted_text, ocr_timings, capture.profile_id
+
+def _duplicate_response(db, pdf_id, discarded_location):
+    """Drops the just-saved copy and returns the existing PDF row with its stored summaries."""
+    if os.path.exists(discarded_location):
+        os.remove(discarded_location)
+    metrics.increment("upload_dedup_hits")
+
+    # Only the start of the (possibly compressed) text is decoded for the preview
+    existing = db.query(PDF.id, PDF.filename, raw_text(PDF.text)).filter(PDF.id == pdf_id).first()
+    summaries = db.query(Summarization.id, Summarization.summary_text).filter(
+        Summarization.pdf_id == pdf_id
+    ).order_by(Summarization.id).all()
+    print(f"♻️ Duplicate upload, reusing PDF ID: {pdf_id}")
+
+    return {
+        "filename": existing.filename,
+        "message": "PDF already uploaded",
+        "pdf_id": existing.id,
+        "duplicate": True,
+        "summaries": [{"summary_id": row[0], "summary": row[1]} for row in summaries],
+        "text_preview": text_prefix(existing[2], TEXT_PREVIEW_CHARS)
+    }
 
 @router.post("/upload")
-async def upload_pdf(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_pdf(
+    response: Response,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    profile: bool = Query(False),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)):
     """Handles PDF file uploads and extracts text."""
     print("📥 Received Upload Request")
+    profile_enabled = profiling_requested(x_profile, profile, x_admin_token)
 
     if not file:
         raise HTTPException(status_code=400, detail="No file provided")
@@ -31,30 +99,50 @@ async def upload_pdf(file: UploadFile = File(...), db: Session = Depends(get_db)
     file_location = os.path.join(UPLOAD_FOLDER, unique_filename)
 
     try:
-        # Save the file to disk
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        content_hash, duplicate_id, extracted_text, ocr_timings, profile_id = await extraction_pool.run(
+            _save_and_extract, file.file, file_location, profile_enabled
+        )
         print(f"✅ Saved PDF as: {unique_filename}")
+        if profile_id:
+            response.headers["X-Profile-Id"] = profile_id
 
-        # ✅ Extract text from PDF
-        file.file.seek(0)  # Reset file pointer for reading
-        pdf_reader = PdfReader(io.BytesIO(file.file.read()))
-        extracted_text = "\n".join([page.extract_text() or "" for page in pdf_reader.pages])
+        if duplicate_id is not None:
+            return _duplicate_response(db, duplicate_id, file_location)
 
         if not extracted_text.strip():
-            extracted_text = "No text extracted (possibly a scanned PDF)"
+            os.remove(file_location)
+            detail = "No text could be extracted from this PDF"
+            if not ocr_available():
+                detail += " (it looks scanned and OCR is not installed on the server)"
+            raise HTTPException(status_code=422, detail=detail)
 
         print("🔹 Extracted Text Preview:", extracted_text[:500])  # Print first 500 chars
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"🚨 Error Processing File: {str(e)}")
         raise HTTPException(status_code=500, detail=f"File processing error: {str(e)}")
 
     # ✅ Save PDF info and extracted text in the database
-    db_pdf = PDF(filename=unique_filename, user_id=1, text=extracted_text)  # ✅ Store text
-    db.add(db_pdf)
-    db.commit()
+    db_pdf = PDF(filename=unique_filename, user_id=1, text=extracted_text, content_hash=content_hash)  # ✅ Store text
+    try:
+        db.add(db_pdf)
+        db.flush()
+        index_pdf(db, db_pdf.id, extracted_text)
+        db.commit()
+    except IntegrityError:
+        # An identical file was stored concurrently since our duplicate check
+        db.rollback()
+        duplicate_id = _find_duplicate(content_hash)
+        if duplicate_id is None:
+            # Not a visible duplicate (the other upload rolled back, or another constraint failed)
+            if os.path.exists(file_location):
+                os.remove(file_location)
+            raise
+        return _duplicate_response(db, duplicate_id, file_location)
     db.refresh(db_pdf)
+    metrics.increment("upload_dedup_misses")
 
     print(f"✅ PDF Stored in DB with ID: {db_pdf.id}")
 
@@ -62,5 +150,7 @@ async def upload_pdf(file: UploadFile = File(...), db: Session = Depends(get_db)
         "filename": unique_filename,
         "message": "PDF uploaded successfully",
         "pdf_id": db_pdf.id,
-        "text_preview": extracted_text[:300]  # Show first 300 characters
+        "duplicate": False,
+        "ocr_pages": ocr_timings,
+        "text_preview": extracted_text[:TEXT_PREVIEW_CHARS]  # Show first 300 characters
     }
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+import os
+from profiling import PROFILE_FOLDER, list_profiles, require_admin
+
+router = APIRouter(prefix="/profiles", tags=["Profiling"], dependencies=[Depends(require_admin)])
+
+@router.get("/")
+def get_profiles():
+    """Lists stored request profiles (admin only)."""
+    return {"profiles": list_profiles()}
+
+@router.get("/{filename}")
+def download_profile(filename: str):
+    """Downloads one profile file (admin only)."""
+    file_path = os.path.join(PROFILE_FOLDER, os.path.basename(filename))
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(file_path, filename=os.path.basename(file_path))
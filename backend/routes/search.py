@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from database import get_db
+from search import search
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+@router.get("")
+def search_documents(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)):
+    """Full-text search over extracted PDF text and summaries, returning ranked snippets."""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty search query")
+    try:
+        results = search(db, q, limit, offset)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
+    return {"query": q, "limit": limit, "offset": offset, "results": results}
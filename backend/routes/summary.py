@@ -1,29 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from database import get_db
-from models import Summarization, PDF
-from transformers import BartTokenizer, BartForConditionalGeneration
+from database import get_db, SessionLocal
+from models import Summarization, PDF, SUMMARY_EXCERPT_CHARS
+from transformers import BartForConditionalGeneration
 import torch
-from sqlalchemy import text
+from sqlalchemy import text, func
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Optional
+from profiling import profile_request, profiling_requested
+from inference import inference_pool, configure_torch_threads, PRIORITY_WEIGHTS
+from shared_weights import SHARED_WEIGHTS, load_shared_model
+from search import index_summary
+from tokenization import load_tokenizer, tokenizer_key, chunk_text, encode_document, encode_text
+from encoder_cache import encoder_cache, share_if_identical
+from onnx_backend import INFERENCE_BACKEND, load_onnx_model
+from model_router import SHORT_DOCUMENT_WORDS, PROFILES, choose_tier
+import speculative
+from batching import generation_batcher, GENERATE_BATCH_SIZE
+from memory_budget import memory_budget, estimate_generation_bytes, current_batch_size, limit_beams, TOKENS_PER_WORD
+from http_cache import make_etag, etag_matches, cache_headers, not_modified
+from checkpoints import RunCheckpoint, run_key, CHECKPOINT_MIN_CHUNKS, CHECKPOINT_INTERVAL_CHUNKS
+import json
+import math
+import os
 import re
 
 router = APIRouter(prefix="/summary", tags=["Summarization"])
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# Bound torch threading before any model loads (TORCH_INTRA_OP_THREADS / TORCH_INTEROP_THREADS)
+configure_torch_threads()
+
 # Load tokenizer and model
 def load_model(model_path, fallback_model="facebook/bart-large-cnn"):
+    if INFERENCE_BACKEND == "onnx":
+        try:
+            return load_onnx_model(model_path, use_cuda=device.type == "cuda"), load_tokenizer(model_path)
+        except Exception as e:
+            print(f"Could not load ONNX model for {model_path}: {str(e)}")
+            print("Falling back to torch backend")
+
     try:
-        model = BartForConditionalGeneration.from_pretrained(model_path).to(device)
-        tokenizer = BartTokenizer.from_pretrained(model_path)
+        if SHARED_WEIGHTS and device.type == "cpu":
+            model = load_shared_model(model_path)
+        else:
+            model = BartForConditionalGeneration.from_pretrained(model_path).to(device)
+        tokenizer = load_tokenizer(model_path)
         print(f"Successfully loaded model from {model_path}")
         return model, tokenizer
     except Exception as e:
         print(f"Error loading model from {model_path}: {str(e)}")
+        if fallback_model is None:
+            raise
         print(f"Falling back to {fallback_model}")
         model = BartForConditionalGeneration.from_pretrained(fallback_model).to(device)
-        tokenizer = BartTokenizer.from_pretrained(fallback_model)
+        tokenizer = load_tokenizer(fallback_model)
         model.save_pretrained(model_path)
         tokenizer.save_pretrained(model_path)
         return model, tokenizer
@@ -42,39 +75,45 @@ except Exception as e:
     fine_tuned_tokenizer = None
     has_fine_tuned = False
 
-def chunk_text(text, chunk_size=1024, overlap=100):
-    """
-    Split text into chunks respecting sentence boundaries when possible.
-    """
-    # Split by sentences
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    chunks = []
-    current_chunk = []
-    current_length = 0
-    
-    for sentence in sentences:
-        sentence_words = sentence.split()
-        sentence_length = len(sentence_words)
-        
-        # If adding this sentence would exceed chunk size and we already have content
-        if current_length + sentence_length > chunk_size and current_length > 0:
-            # Add the current chunk to our list of chunks
-            chunks.append(" ".join(current_chunk))
-            
-            # Start a new chunk with overlap
-            overlap_start = max(0, len(current_chunk) - overlap)
-            current_chunk = current_chunk[overlap_start:]
-            current_length = len(current_chunk)
-        
-        # Add the sentence to the current chunk
-        current_chunk.extend(sentence_words)
-        current_length += sentence_length
-    
-    # Add the last chunk if it has content
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-    
-    return chunks
+# Optional distilled tier (e.g. a local distilbart-cnn checkpoint) for short documents and fast requests
+DISTILLED_MODEL_PATH = os.getenv("DISTILLED_MODEL_PATH", "./distilbart_model")
+distilled_model = distilled_tokenizer = None
+if os.path.isdir(DISTILLED_MODEL_PATH):
+    print("Loading distilled model...")
+    try:
+        distilled_model, distilled_tokenizer = load_model(DISTILLED_MODEL_PATH, fallback_model=None)
+    except Exception as e:
+        print(f"Could not load distilled model: {str(e)}")
+has_distilled = distilled_model is not None
+
+# Model tiers by model_type
+MODELS = {"pretrained": (pretrained_model, tokenizer)}
+if has_fine_tuned:
+    MODELS["fine-tuned"] = (fine_tuned_model, fine_tuned_tokenizer)
+if has_distilled:
+    MODELS["distilled"] = (distilled_model, distilled_tokenizer)
+
+# Draft model for speculative decoding: the distilled tier unless DRAFT_MODEL_PATH names another checkpoint
+DRAFT_MODEL_PATH = os.getenv("DRAFT_MODEL_PATH", DISTILLED_MODEL_PATH)
+draft_model = draft_tokenizer = None
+if os.path.normpath(DRAFT_MODEL_PATH) == os.path.normpath(DISTILLED_MODEL_PATH):
+    draft_model, draft_tokenizer = distilled_model, distilled_tokenizer
+elif os.path.isdir(DRAFT_MODEL_PATH):
+    print("Loading draft model...")
+    try:
+        draft_model, draft_tokenizer = load_model(DRAFT_MODEL_PATH, fallback_model=None)
+    except Exception as e:
+        print(f"Could not load draft model: {str(e)}")
+
+def is_torch_model(model):
+    return isinstance(model, torch.nn.Module)
+
+def model_backend(model):
+    return "torch" if is_torch_model(model) else "onnx"
+
+# Identical encoders (e.g. encoder frozen during fine-tuning) share cached encoder outputs
+if has_fine_tuned and is_torch_model(pretrained_model) and is_torch_model(fine_tuned_model) and share_if_identical("bart-shared-encoder", pretrained_model, fine_tuned_model):
+    print("Pretrained and fine-tuned models share an encoder")
 
 def ensure_complete_sentence(text):
     """Ensure the text ends with a sentence-ending punctuation."""
@@ -92,20 +131,72 @@ def ensure_complete_sentence(text):
             # If no sentence-ending punctuation found, add a period
             return text + "."
     return text
+
+def draft_for(model, model_tokenizer):
+    """The draft model that can assist model, or None (draft missing, ONNX, same model or other vocabulary)."""
+    if draft_model is None or draft_model is model:
+        return None
+    if not is_torch_model(model) or not is_torch_model(draft_model):
+        return None
+    if tokenizer_key(model_tokenizer) != tokenizer_key(draft_tokenizer):
+        return None
+    return draft_model
+
+def _generate_summary(model, model_tokenizer, input_ids, **generate_kwargs):
+    """
+    Generates one summary from already tokenized input and decodes it.
+    For torch models the encoder pass comes from encoder_cache, so only decoding is
+    repeated for a chunk seen before with other generation settings. Inside
+    speculative.speculative_decoding() the summary is decoded greedily with the draft model.
+    """
+    input_tensor = torch.tensor([input_ids], device=device)
+    attention_mask = torch.ones_like(input_tensor)
+    if not is_torch_model(model):
+        # ONNX Runtime model: encoder and decoder-with-past sessions run inside generate()
+        summary_ids = model.generate(input_tensor, attention_mask=attention_mask, **generate_kwargs)
+        return model_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+
+    encoder_outputs = encoder_cache.encode(model, input_tensor, attention_mask)
+    if speculative.current() is not None:
+        summary_ids = speculative.assisted_generate(
+            model, input_tensor, attention_mask, encoder_outputs, **generate_kwargs
+        )
+        return model_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+
+    summary_ids = model.generate(
+        input_tensor,
+        attention_mask=attention_mask,
+        encoder_outputs=encoder_outputs,
+        **generate_kwargs
+    )
+    return model_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+
+def _generate_summaries(model, model_tokenizer, chunks_ids, **generate_kwargs):
+    """
+    Generates one summary per chunk, in order. Torch models run the chunks, together
+    with chunks of concurrent requests using the same settings, in length-bucketed
+    batches; ONNX models and speculative decoding go one chunk at a time.
+    """
+    generate_kwargs = speculative.decoding_settings(limit_beams(generate_kwargs))
+    if not is_torch_model(model) or speculative.current() is not None:
+        return [_generate_summary(model, model_tokenizer, input_ids, **generate_kwargs) for input_ids in chunks_ids]
+    outputs = generation_batcher.generate(model, chunks_ids, batch_size=current_batch_size(), **generate_kwargs)
+    return [model_tokenizer.decode(summary_ids, skip_special_tokens=True) for summary_ids in outputs]
+
 def summarize_with_fine_tuned(text, model, tokenizer):
     """Direct summarization with fine-tuned model, optimized for longer outputs."""
     print("Using specialized fine-tuned model summarization function")
     
     # For shorter texts, try direct summarization
-    if len(text.split()) < 2000:
+    if len(text.split()) < SHORT_DOCUMENT_WORDS:
         print("Text is short enough for direct summarization")
         
         # Truncate to fit model's max input
-        inputs = tokenizer(text, return_tensors="pt", max_length=1024, truncation=True).to(device)
+        input_ids = encode_text(text, tokenizer, max_length=1024)
         
         # Generate with parameters optimized for longer summaries
-        summary_ids = model.generate(
-            inputs["input_ids"],
+        summary = _generate_summary(
+            model, tokenizer, input_ids,
             max_length=500,  # Longer max length
             min_length=100,  # Lower min length
             num_beams=6,     # More beam search paths
@@ -118,37 +209,33 @@ def summarize_with_fine_tuned(text, model, tokenizer):
             temperature=0.8  # Slightly random
         )
         
-        summary = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
         print(f"Direct fine-tuned summary length: {len(summary.split())} words")
         return ensure_complete_sentence(summary)
     
     # For longer texts, use chunking with special parameters
     else:
         print("Text is too long, using chunked summarization")
-        chunks = chunk_text(text)
+        chunks_ids = encode_document(text, tokenizer, chunk_text)
         summaries = []
         
         # Parameters specifically for fine-tuned model
         min_len = max(100, len(text.split()) // 6)
         max_len = min(800, len(text.split()) // 2)
         
-        for chunk in chunks:
-            inputs = tokenizer(chunk, return_tensors="pt", max_length=1024, truncation=True).to(device)
-            
-            summary_ids = model.generate(
-                inputs["input_ids"], 
-                max_length=max_len, 
-                min_length=min_len,
-                num_beams=6, 
-                length_penalty=2.0,  # Strongly encourage longer outputs
-                early_stopping=False,
-                repetition_penalty=1.0,  # Less repetition penalty
-                no_repeat_ngram_size=2,  # Less restrictive on repeats
-                do_sample=True,
-                top_p=0.95,
-                temperature=0.8
-            )
-            chunk_summary = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+        chunk_summaries = _generate_summaries(
+            model, tokenizer, chunks_ids,
+            max_length=max_len, 
+            min_length=min_len,
+            num_beams=6, 
+            length_penalty=2.0,  # Strongly encourage longer outputs
+            early_stopping=False,
+            repetition_penalty=1.0,  # Less repetition penalty
+            no_repeat_ngram_size=2,  # Less restrictive on repeats
+            do_sample=True,
+            top_p=0.95,
+            temperature=0.8
+        )
+        for chunk_summary in chunk_summaries:
             print(f"Chunk summary length: {len(chunk_summary.split())} words")
             summaries.append(chunk_summary)
         
@@ -157,6 +244,186 @@ def summarize_with_fine_tuned(text, model, tokenizer):
 
 
 
+# Generation settings of the hierarchical path for long documents (more than 3 chunks)
+FIRST_LEVEL_SETTINGS = dict(
+    max_length=300,  # Shorter for first level
+    min_length=100,
+    num_beams=4,
+    length_penalty=1.2,
+    early_stopping=False,
+    repetition_penalty=1.2
+)
+SECOND_LEVEL_SETTINGS = dict(
+    max_length=500,  # Longer for final summary
+    min_length=200,
+    num_beams=5,
+    length_penalty=1.5,
+    early_stopping=False,
+    repetition_penalty=1.2
+)
+
+# Upper bound on pdf_ids per /summarize-batch/ request
+MAX_BATCH_DOCUMENTS = int(os.getenv("MAX_BATCH_DOCUMENTS", "20"))
+
+def _model_fingerprint(model):
+    """Checkpoint path plus the newest file time in it, so retrained weights get new checkpoint keys."""
+    path = getattr(model.config, "_name_or_path", "") or ""
+    try:
+        return f"{path}@{max(os.path.getmtime(os.path.join(path, name)) for name in os.listdir(path))}"
+    except (OSError, ValueError):
+        return path
+
+def _chunk_settings(text, chunks_ids, model_tokenizer):
+    """Generation settings for a document's chunks: first level of the hierarchy, or length-scaled for shorter documents."""
+    if len(chunks_ids) > 3:
+        return FIRST_LEVEL_SETTINGS
+
+    input_length = len(text.split())
+    return dict(
+        max_length=min(600, input_length // 2),  # Increased max length
+        min_length=max(150, input_length // 4),  # Adjusted for better length
+        num_beams=5, 
+        length_penalty=1.5,  # Increased to favor longer summaries
+        early_stopping=False,  # Changed to ensure completion
+        repetition_penalty=1.2, 
+        no_repeat_ngram_size=3,
+        forced_bos_token_id=model_tokenizer.bos_token_id,
+        do_sample=False  # Ensure deterministic output
+    )
+
+def _checkpoint_for(text, model, chunks_ids, settings, level=1):
+    """RunCheckpoint for summarizing text's chunks with these settings, or None for runs too short to checkpoint."""
+    if CHECKPOINT_MIN_CHUNKS <= 0 or len(chunks_ids) < CHECKPOINT_MIN_CHUNKS:
+        return None
+    key = run_key(text, _model_fingerprint(model), limit_beams(settings), speculative.current() is not None, level)
+    return RunCheckpoint(key, level)
+
+def _generate_runs(model, model_tokenizer, runs, **generate_kwargs):
+    """
+    Generates chunk summaries for several runs of (checkpoint or None, chunks_ids) in
+    shared batches, returning one summary list per run. Chunks completed by an earlier
+    attempt are read from the checkpoint; when any run is checkpointed, the rest are
+    generated CHECKPOINT_INTERVAL_CHUNKS at a time and saved after each step.
+    """
+    results = [checkpoint.load() if checkpoint else {} for checkpoint, _ in runs]
+    missing = [
+        (run, position)
+        for run, (_, chunks_ids) in enumerate(runs)
+        for position in range(len(chunks_ids)) if position not in results[run]
+    ]
+    step = CHECKPOINT_INTERVAL_CHUNKS if any(checkpoint for checkpoint, _ in runs) else len(missing)
+    for start in range(0, len(missing), max(1, step)):
+        items = missing[start:start + step]
+        summaries = _generate_summaries(
+            model, model_tokenizer, [runs[run][1][position] for run, position in items], **generate_kwargs
+        )
+        completed = {}
+        for (run, position), summary in zip(items, summaries):
+            results[run][position] = summary
+            completed.setdefault(run, {})[position] = summary
+        for run, chunk_summaries in completed.items():
+            if runs[run][0]:
+                runs[run][0].save(chunk_summaries)
+    return [[result[position] for position in range(len(chunks_ids))] for result, (_, chunks_ids) in zip(results, runs)]
+
+def summarize_documents(texts, model, model_tokenizer):
+    """
+    Summarizes several documents at once, returning one summary per text.
+    Chunks of all documents with the same generation settings (e.g. every long
+    document's first level) are generated in shared length-bucketed batches, and so
+    are the second-level summaries.
+    """
+    # Tokenized once per document and tokenizer; retries and other models reuse the ids
+    chunks_per_doc = [encode_document(text, model_tokenizer, chunk_text) for text in texts]
+    settings_per_doc = [
+        _chunk_settings(text, chunks_ids, model_tokenizer) for text, chunks_ids in zip(texts, chunks_per_doc)
+    ]
+
+    # First level: one batched run per distinct settings across all documents; long
+    # documents are checkpointed so a retry after a crash resumes from completed chunks
+    chunk_summaries = [None] * len(texts)
+    groups = {}
+    for doc, settings in enumerate(settings_per_doc):
+        groups.setdefault(tuple(sorted(settings.items())), []).append(doc)
+    checkpoints = []
+    for settings, docs in groups.items():
+        runs = [
+            (_checkpoint_for(texts[doc], model, chunks_per_doc[doc], dict(settings)), chunks_per_doc[doc])
+            for doc in docs
+        ]
+        checkpoints.extend(checkpoint for checkpoint, _ in runs if checkpoint)
+        for doc, summaries in zip(docs, _generate_runs(model, model_tokenizer, runs, **dict(settings))):
+            chunk_summaries[doc] = summaries
+
+    # Second level for long documents (summarize the summaries), batched across documents
+    results = [" ".join(summaries) for summaries in chunk_summaries]
+    hierarchical = [doc for doc, settings in enumerate(settings_per_doc) if settings is FIRST_LEVEL_SETTINGS]
+    if hierarchical:
+        final_summaries = _generate_summaries(
+            model, model_tokenizer,
+            [encode_text(results[doc], model_tokenizer, max_length=1024) for doc in hierarchical],
+            **SECOND_LEVEL_SETTINGS
+        )
+        for doc, final_summary in zip(hierarchical, final_summaries):
+            results[doc] = final_summary
+
+    for checkpoint in checkpoints:
+        checkpoint.clear()
+    return [ensure_complete_sentence(summary) for summary in results]
+
+def combine_summaries(summaries, model, model_tokenizer):
+    """
+    Cross-document summary: the per-document summaries are reduced level by level
+    (chunked and summarized with the first-level settings) until they fit one input,
+    then summarized with the second-level settings.
+    """
+    combined = " ".join(summaries)
+    chunks_ids = encode_document(combined, model_tokenizer, chunk_text)
+    checkpoints = []
+    level = 2
+    while len(chunks_ids) > 1:
+        checkpoint = _checkpoint_for(combined, model, chunks_ids, FIRST_LEVEL_SETTINGS, level)
+        if checkpoint:
+            checkpoints.append(checkpoint)
+        level_summaries = _generate_runs(model, model_tokenizer, [(checkpoint, chunks_ids)], **FIRST_LEVEL_SETTINGS)[0]
+        combined = " ".join(level_summaries)
+        chunks_ids = encode_document(combined, model_tokenizer, chunk_text)
+        level += 1
+    if not chunks_ids:
+        return ""
+    final_summary = _generate_summaries(model, model_tokenizer, chunks_ids, **SECOND_LEVEL_SETTINGS)[0]
+    for checkpoint in checkpoints:
+        checkpoint.clear()
+    return ensure_complete_sentence(final_summary)
+
+def _estimate_summary_bytes(word_counts, model, batch_size=None, max_beams=None, combined=False):
+    """
+    Estimated peak memory of summarize_documents() (and combine_summaries()) for
+    documents of these word counts, following chunk_text and the generation settings
+    above without tokenizing. batch_size and max_beams are the plan's limits.
+    """
+    batch_size = batch_size or GENERATE_BATCH_SIZE
+
+    def estimate(batch, input_tokens, settings):
+        beams = min(settings["num_beams"], max_beams or settings["num_beams"])
+        return estimate_generation_bytes(model, min(batch, batch_size), input_tokens, beams, settings["max_length"])
+
+    peaks = []
+    first_level_chunks = hierarchical_docs = 0
+    for words in word_counts:
+        chunks = max(1, math.ceil((words - 100) / 924))  # chunk_text: 1024 words, 100 overlap
+        input_tokens = min(1024, math.ceil(min(words, 1024) * TOKENS_PER_WORD))
+        if chunks > 3:
+            first_level_chunks += chunks
+            hierarchical_docs += 1
+        else:
+            settings = {"num_beams": 5, "max_length": min(600, words // 2)}
+            peaks.append(estimate(chunks, input_tokens, settings))
+    if first_level_chunks or combined:
+        peaks.append(estimate(max(1, first_level_chunks), 1024, FIRST_LEVEL_SETTINGS))
+        peaks.append(estimate(max(1, hierarchical_docs), 1024, SECOND_LEVEL_SETTINGS))
+    return max(peaks)
+
 def summarize_large_text(text, model, model_tokenizer=None):
     """
     Generate a summary for large text by chunking and summarizing.
@@ -164,69 +431,17 @@ def summarize_large_text(text, model, model_tokenizer=None):
     """
     if model_tokenizer is None:
         model_tokenizer = tokenizer
-        
-    chunks = chunk_text(text)
-    
-    # For very long documents, use hierarchical summarization
-    if len(chunks) > 3:
-        # First level summarization
-        first_level_summaries = []
-        for chunk in chunks:
-            inputs = model_tokenizer(chunk, return_tensors="pt", max_length=1024, truncation=True).to(device)
-            summary_ids = model.generate(
-                inputs["input_ids"], 
-                max_length=300,  # Shorter for first level
-                min_length=100,
-                num_beams=4,
-                length_penalty=1.2,
-                early_stopping=False,
-                repetition_penalty=1.2
-            )
-            chunk_summary = model_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-            first_level_summaries.append(chunk_summary)
-        
-        # Second level summarization (summarize the summaries)
-        combined_summary = " ".join(first_level_summaries)
-        inputs = model_tokenizer(combined_summary, return_tensors="pt", max_length=1024, truncation=True).to(device)
-        summary_ids = model.generate(
-            inputs["input_ids"], 
-            max_length=500,  # Longer for final summary
-            min_length=200,
-            num_beams=5,
-            length_penalty=1.5,
-            early_stopping=False,
-            repetition_penalty=1.2
-        )
-        final_summary = model_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-        return ensure_complete_sentence(final_summary)
-    
-    # For shorter documents, summarize each chunk and join
-    else:
-        summaries = []
-        input_length = len(text.split())
-        min_len = max(150, input_length // 4)  # Adjusted for better length
-        max_len = min(600, input_length // 2)  # Increased max length
-        
-        for chunk in chunks:
-            inputs = model_tokenizer(chunk, return_tensors="pt", max_length=1024, truncation=True).to(device)
-            summary_ids = model.generate(
-                inputs["input_ids"], 
-                max_length=max_len, 
-                min_length=min_len,
-                num_beams=5, 
-                length_penalty=1.5,  # Increased to favor longer summaries
-                early_stopping=False,  # Changed to ensure completion
-                repetition_penalty=1.2, 
-                no_repeat_ngram_size=3,
-                forced_bos_token_id=model_tokenizer.bos_token_id,
-                do_sample=False  # Ensure deterministic output
-            )
-            chunk_summary = model_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-            summaries.append(chunk_summary)
-        
-        # This return statement was incorrectly indented in your original code
-        joined_summary = " ".join(summaries)
-        return ensure_complete_sentence(joined_summary)
+    return summarize_documents([text], model, model_tokenizer)[0]
+
+def _summarize_profiled(text, model, model_tokenizer, profile_enabled, draft=None):
+    """
+    Runs summarize_large_text on an inference worker, returning (summary, profile_id,
+    speculative stats or None). With a draft model the summary is decoded speculatively.
+    """
+    with profile_request("summarize", enabled=profile_enabled) as capture:
+        with speculative.speculative_decoding(draft, enabled=draft is not None) as spec_stats:
+            summary = summarize_large_text(text, model, model_tokenizer)
+    return summary, capture.profile_id, spec_stats
 
 @router.get("/")
 def test_summary():
@@ -234,21 +449,61 @@ def test_summary():
         "message": "Summarization module is working!",
         "models_available": {
             "pretrained": True,
-            "fine_tuned": has_fine_tuned
-        }
+            "fine_tuned": has_fine_tuned,
+            "distilled": has_distilled
+        },
+        "backends": {tier: model_backend(model) for tier, (model, _) in MODELS.items()},
+        "speculative_draft": draft_model is not None,
+        "inference_pool": inference_pool.stats()
     }
 
+def _validate_model_request(model_type, profile, priority="interactive"):
+    """Raises 400 for an unknown or unavailable model type, an unknown profile or priority class."""
+    if model_type not in ["pretrained", "fine-tuned", "distilled", "auto"]:
+        print(f"Invalid model type: {model_type}")
+        raise HTTPException(status_code=400, detail=f"Invalid model type: {model_type}. Use 'pretrained', 'fine-tuned', 'distilled' or 'auto'")
+    
+    # Check if fine-tuned model is requested but not available
+    if model_type == "fine-tuned" and not has_fine_tuned:
+        print("Fine-tuned model requested but not available")
+        raise HTTPException(status_code=400, detail="Fine-tuned model is not available")
+
+    if model_type == "distilled" and not has_distilled:
+        raise HTTPException(status_code=400, detail="Distilled model is not available")
+
+    if profile not in PROFILES:
+        raise HTTPException(status_code=400, detail=f"Invalid profile: {profile}. Use one of {', '.join(PROFILES)}")
+
+    if priority not in PRIORITY_WEIGHTS:
+        raise HTTPException(status_code=400, detail=f"Invalid priority: {priority}. Use one of {', '.join(PRIORITY_WEIGHTS)}")
+
+def _index_summaries(db, model_type, summaries):
+    """
+    Indexes {pdf_id: summary} for search and commits. Handlers run it with
+    run_in_threadpool: a locked SQLite write can wait seconds and must not stall the event loop.
+    """
+    for pdf_id, summary in summaries.items():
+        index_summary(db, pdf_id, model_type, summary)
+    db.commit()
+
 class SummaryRequest(BaseModel):
     pdf_id: int
     user_id: int
     model_type: str = "pretrained"  # Changed from "model" to "model_type" for clarity
+    profile: str = "balanced"  # Used by model_type "auto": "quality", "balanced" or "fast"
+    speculative: Optional[bool] = None  # Greedy decoding assisted by the draft model; None = on for SPECULATIVE_PROFILES
+    priority: str = "interactive"  # Queue class: "interactive" or "batch"
 
 @router.post("/summarize/")
 async def summarize_pdf(
     request: SummaryRequest,
-    db: Session = Depends(get_db)):
+    db: Session = Depends(get_db),
+    profile: bool = Query(False),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)):
     
     print(f"🔍 Incoming Request: {request}")  # Debug request
+    profile_enabled = profiling_requested(x_profile, profile, x_admin_token)
     pdf_id = request.pdf_id
     user_id = request.user_id
     model_type = request.model_type.lower()
@@ -256,14 +511,7 @@ async def summarize_pdf(
     print(f"Model type requested: {model_type}")  # Add this debug line
     
     # Validate model type
-    if model_type not in ["pretrained", "fine-tuned"]:
-        print(f"Invalid model type: {model_type}")
-        raise HTTPException(status_code=400, detail=f"Invalid model type: {model_type}. Use 'pretrained' or 'fine-tuned'")
-    
-    # Check if fine-tuned model is requested but not available
-    if model_type == "fine-tuned" and not has_fine_tuned:
-        print("Fine-tuned model requested but not available")
-        raise HTTPException(status_code=400, detail="Fine-tuned model is not available")
+    _validate_model_request(model_type, request.profile, request.priority)
     
     # Force regeneration of summary with the requested model
     # Comment out or remove the existing summary check to always generate a new summary
@@ -274,8 +522,8 @@ async def summarize_pdf(
     # if summary_entry:
     #     return {"pdf_id": pdf_id, "summary": summary_entry.summary_text, "model_used": "unknown (from database)"}
     
-    # Get PDF
-    pdf_entry = db.query(PDF).filter(PDF.id == pdf_id).first()
+    # Get PDF (loading and decompressing the text happens in the threadpool)
+    pdf_entry = await run_in_threadpool(lambda: db.query(PDF).filter(PDF.id == pdf_id).first())
     
     if not pdf_entry:
         print(f"PDF with id {pdf_id} not found.")
@@ -284,20 +532,47 @@ async def summarize_pdf(
         print(f"PDF with id {pdf_id} is empty.")
         raise HTTPException(status_code=404, detail="PDF is empty.")
     
-    # Select model based on request
-    if model_type == "fine-tuned":
-        print("Using fine-tuned model")
-        selected_model = fine_tuned_model
-        selected_tokenizer = fine_tuned_tokenizer
-    else:
-        print("Using pretrained model")
-        selected_model = pretrained_model
-        selected_tokenizer = tokenizer
+    # Select model based on request ("auto" routes by document length, profile and load)
+    routing_reason = None
+    if model_type == "auto":
+        model_type, routing_reason = choose_tier(
+            len(pdf_entry.text.split()), request.profile, inference_pool.queue_depth(), MODELS
+        )
+        print(f"Routed to {model_type} model: {routing_reason}")
+    print(f"Using {model_type} model")
+    selected_model, selected_tokenizer = MODELS[model_type]
+
+    # Speculative (greedy, draft-assisted) decoding when asked for, or by default for
+    # profiles in SPECULATIVE_PROFILES; a profile default without a usable draft decodes normally
+    draft = None
+    use_speculative = request.speculative
+    if use_speculative is None:
+        use_speculative = request.profile in speculative.SPECULATIVE_PROFILES
+    if use_speculative:
+        draft = draft_for(selected_model, selected_tokenizer)
+        if draft is None and request.speculative:
+            raise HTTPException(status_code=400, detail=f"Speculative decoding is not available for the {model_type} model")
     
     # Generate summary
-    print(f"Generating summary with {model_type} model")
-    summary = summarize_large_text(pdf_entry.text, selected_model, selected_tokenizer)
+    print(f"Generating summary with {model_type} model" + (" (speculative)" if draft is not None else ""))
+    # Admitted once its estimated peak memory fits the budget (lighter plan if it never would),
+    # then queued fairly per user; longer documents count as larger jobs
+    word_count = len(pdf_entry.text.split())
+    memory_plan = memory_budget.plan(
+        lambda batch_size, max_beams: _estimate_summary_bytes(
+            [word_count], selected_model, batch_size, 1 if draft is not None else max_beams
+        )
+    )
+    async with memory_budget.admit(memory_plan[3]):
+        summary, profile_id, spec_stats = await inference_pool.run(
+            memory_budget.run_tracked, memory_plan,
+            _summarize_profiled, pdf_entry.text, selected_model, selected_tokenizer, profile_enabled, draft,
+            user_id=user_id, priority=request.priority, cost=max(1.0, word_count / SHORT_DOCUMENT_WORDS)
+        )
     print(f"Summary generated: {summary[:100]}...")  # Print first 100 chars of summary
+
+    # Keep the search index in sync with the latest summary for this model
+    await run_in_threadpool(_index_summaries, db, model_type, {pdf_id: summary})
     
     # Save to database - optional, you can comment this out if you don't want to save
     # new_summary = Summarization(
@@ -309,11 +584,105 @@ async def summarize_pdf(
     # db.add(new_summary)
     # db.commit()
     
+    headers = {"X-Profile-Id": profile_id} if profile_id else None
+    content = {"pdf_id": pdf_id, "summary": summary, "model_used": model_type}
+    if routing_reason:
+        content["routing_reason"] = routing_reason
+    if use_speculative:
+        # False when the draft could not be used and the summary was decoded normally
+        content["speculative_applied"] = spec_stats is not None and spec_stats.chunks > 0
+    if spec_stats is not None:
+        content["decoding"] = "greedy"
+        content["speculative"] = spec_stats.as_dict()
+    if memory_plan[0] != "full":
+        content["memory_plan"] = memory_plan[0]
     return JSONResponse(
-        content={"pdf_id": pdf_id, "summary": summary, "model_used": model_type}, 
-        status_code=200
+        content=content, 
+        status_code=200,
+        headers=headers
     )
 
+class BatchSummaryRequest(BaseModel):
+    pdf_ids: List[int]
+    user_id: int
+    model_type: str = "pretrained"
+    profile: str = "balanced"
+    combined: bool = False  # Also summarize the documents together
+    priority: str = "batch"
+
+def _summarize_batch(texts, model, model_tokenizer, combined):
+    """Runs one batch request on an inference worker: (per-document summaries, combined summary or None)."""
+    summaries = summarize_documents(texts, model, model_tokenizer)
+    return summaries, combine_summaries(summaries, model, model_tokenizer) if combined else None
+
+@router.post("/summarize-batch/")
+async def summarize_batch(request: BatchSummaryRequest, db: Session = Depends(get_db)):
+    """
+    Summarizes several PDFs in one inference job, batching generation across the
+    documents, and optionally adds a combined cross-document summary.
+    """
+    model_type = request.model_type.lower()
+    _validate_model_request(model_type, request.profile, request.priority)
+
+    pdf_ids = list(dict.fromkeys(request.pdf_ids))
+    if not pdf_ids:
+        raise HTTPException(status_code=400, detail="No pdf_ids given.")
+    if len(pdf_ids) > MAX_BATCH_DOCUMENTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_DOCUMENTS} PDFs per batch.")
+
+    pdfs = await run_in_threadpool(lambda: {pdf.id: pdf for pdf in db.query(PDF).filter(PDF.id.in_(pdf_ids))})
+    missing = [pdf_id for pdf_id in pdf_ids if pdf_id not in pdfs]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"PDFs not found: {missing}")
+    empty = [pdf_id for pdf_id in pdf_ids if not pdfs[pdf_id].text.strip()]
+    if empty:
+        raise HTTPException(status_code=404, detail=f"PDFs are empty: {empty}")
+
+    texts = [pdfs[pdf_id].text for pdf_id in pdf_ids]
+    # Read before the commit below expires the rows
+    filenames = {pdf_id: pdfs[pdf_id].filename for pdf_id in pdf_ids}
+    routing_reason = None
+    if model_type == "auto":
+        model_type, routing_reason = choose_tier(
+            sum(len(text.split()) for text in texts), request.profile, inference_pool.queue_depth(), MODELS
+        )
+    selected_model, selected_tokenizer = MODELS[model_type]
+
+    print(f"📚 Summarizing {len(pdf_ids)} PDFs with {model_type} model" + (" (combined)" if request.combined else ""))
+    word_counts = [len(text.split()) for text in texts]
+    memory_plan = memory_budget.plan(
+        lambda batch_size, max_beams: _estimate_summary_bytes(
+            word_counts, selected_model, batch_size, max_beams, request.combined
+        )
+    )
+    async with memory_budget.admit(memory_plan[3]):
+        summaries, combined_summary = await inference_pool.run(
+            memory_budget.run_tracked, memory_plan,
+            _summarize_batch, texts, selected_model, selected_tokenizer, request.combined,
+            user_id=request.user_id, priority=request.priority, cost=max(1.0, sum(word_counts) / SHORT_DOCUMENT_WORDS)
+        )
+
+    await run_in_threadpool(_index_summaries, db, model_type, dict(zip(pdf_ids, summaries)))
+
+    content = {
+        "results": [
+            {"pdf_id": pdf_id, "filename": filenames[pdf_id], "summary": summary}
+            for pdf_id, summary in zip(pdf_ids, summaries)
+        ],
+        "combined_summary": combined_summary,
+        "model_used": model_type,
+    }
+    if routing_reason:
+        content["routing_reason"] = routing_reason
+    if memory_plan[0] != "full":
+        content["memory_plan"] = memory_plan[0]
+    return content
+
+@router.get("/queue/{user_id}")
+def get_queue_position(user_id: int):
+    """Reports a user's running and queued summaries with their positions in the inference queue."""
+    return inference_pool.user_queue(user_id)
+
 @router.get("/test-models/{pdf_id}")
 async def test_models(pdf_id: int, db: Session = Depends(get_db)):
     """Generate summaries with both models without saving to database"""
@@ -327,7 +696,7 @@ async def test_models(pdf_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="PDF is empty")
     
     # Generate summaries with both models
-    pretrained_summary = summarize_large_text(pdf_entry.text, pretrained_model, tokenizer)
+    pretrained_summary = await inference_pool.run(summarize_large_text, pdf_entry.text, pretrained_model, tokenizer)
     
     result = {
         "pdf_id": pdf_id,
@@ -338,23 +707,107 @@ async def test_models(pdf_id: int, db: Session = Depends(get_db)):
     
     # Generate fine-tuned summary if available
     if has_fine_tuned:
-        fine_tuned_summary = summarize_large_text(pdf_entry.text, fine_tuned_model, fine_tuned_tokenizer)
+        fine_tuned_summary = await inference_pool.run(
+            summarize_large_text, pdf_entry.text, fine_tuned_model, fine_tuned_tokenizer
+        )
         result["fine_tuned_summary"] = fine_tuned_summary
     
     return result
 
+SUMMARY_PAGE_SIZE = 50
+SUMMARY_MAX_PAGE_SIZE = 500
+SUMMARY_EXPORT_BATCH_SIZE = 500
+
+def _summary_page_query(db, columns, after, user_id, limit):
+    query = db.query(*columns).join(PDF, PDF.id == Summarization.pdf_id).filter(Summarization.id > (after or 0))
+    if user_id is not None:
+        query = query.filter(Summarization.user_id == user_id)
+    return query.order_by(Summarization.id).limit(limit)
+
+def _summary_page_etag(summary_ids, user_id, limit, excerpt_chars):
+    """ETag of a page from its summary ids: summaries and filenames are never edited, only added or deleted."""
+    return make_etag("summaries", summary_ids, user_id, limit, excerpt_chars)
+
+def _fetch_summary_page(db, after=None, user_id=None, limit=SUMMARY_PAGE_SIZE, excerpt_chars=None):
+    """Keyset-paginated page of summaries ordered by summarization.id, projecting only needed columns."""
+    # Short excerpts come from the plain summary_excerpt column, cut in SQL, so compressed
+    # summary texts are neither loaded nor decompressed
+    from_excerpt = excerpt_chars is not None and excerpt_chars <= SUMMARY_EXCERPT_CHARS
+    if from_excerpt:
+        text_column = func.substr(Summarization.summary_excerpt, 1, excerpt_chars)
+    else:
+        text_column = Summarization.summary_text
+    rows = _summary_page_query(db, (Summarization.id, PDF.id, PDF.filename, text_column), after, user_id, limit).all()
+
+    # Rows written before summary_excerpt existed and not yet backfilled
+    missing = [row[0] for row in rows if row[3] is None] if from_excerpt else []
+    full_texts = dict(
+        db.query(Summarization.id, Summarization.summary_text).filter(Summarization.id.in_(missing))
+    ) if missing else {}
+
+    page = []
+    for summary_id, pdf_id, filename, summary in rows:
+        if summary is None and from_excerpt:
+            summary = full_texts.get(summary_id, "")
+        page.append({"summary_id": summary_id, "pdf_id": pdf_id, "filename": filename,
+                     "summary": summary[:excerpt_chars] if excerpt_chars else summary})
+    return page
+
+def _export_summaries(user_id, excerpt_chars):
+    """Streams every matching summary as one JSON array, one keyset batch at a time."""
+    db = SessionLocal()  # Own session: the request's session is closed before streaming ends
+    try:
+        yield "["
+        after, first = None, True
+        while True:
+            page = _fetch_summary_page(db, after, user_id, SUMMARY_EXPORT_BATCH_SIZE, excerpt_chars)
+            for item in page:
+                yield ("" if first else ",") + json.dumps(item)
+                first = False
+            if len(page) < SUMMARY_EXPORT_BATCH_SIZE:
+                break
+            after = page[-1]["summary_id"]
+        yield "]"
+    finally:
+        db.close()
+
 @router.get("/get_all_summaries/")
-async def get_all_summaries(db: Session = Depends(get_db)):
+async def get_all_summaries(
+    db: Session = Depends(get_db),
+    limit: Optional[int] = Query(
+        None, ge=1, le=SUMMARY_MAX_PAGE_SIZE, description="Page size; without limit and after, every summary is returned"
+    ),
+    after: Optional[int] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    user_id: Optional[int] = Query(None),
+    excerpt_chars: Optional[int] = Query(None, ge=1, description="Return only the first N characters of each summary"),
+    export: bool = Query(False, description="Stream all matching summaries as one JSON array"),
+    if_none_match: Optional[str] = Header(None)):
+    if export:
+        return StreamingResponse(_export_summaries(user_id, excerpt_chars), media_type="application/json")
+
+    # Unpaginated callers (the dashboard) get every summary as before; paging starts with limit or after
+    if limit is None and after is not None:
+        limit = SUMMARY_PAGE_SIZE
+
     try:
-        summaries = db.execute(text("""
-            SELECT pdfs.id, pdfs.filename, summarization.summary_text 
-            FROM pdfs 
-            INNER JOIN summarization ON pdfs.id = summarization.pdf_id
-        """)).fetchall()
+        # Revalidation only reads the page's ids; summary texts are loaded when the page changed
+        if if_none_match:
+            summary_ids = [row[0] for row in _summary_page_query(db, (Summarization.id,), after, user_id, limit)]
+            etag = _summary_page_etag(summary_ids, user_id, limit, excerpt_chars)
+            if summary_ids and etag_matches(if_none_match, etag):
+                headers = {"X-Next-Cursor": str(summary_ids[-1])} if limit and len(summary_ids) == limit else None
+                return not_modified(etag, headers)
+
+        summaries = _fetch_summary_page(db, after, user_id, limit, excerpt_chars)
         
-        if not summaries:
+        if not summaries and after is None:
             raise HTTPException(status_code=404, detail="No summaries found")
         
-        return [{"pdf_id": row[0], "filename": row[1], "summary": row[2]} for row in summaries]
+        headers = cache_headers(_summary_page_etag([item["summary_id"] for item in summaries], user_id, limit, excerpt_chars))
+        if limit and len(summaries) == limit:
+            headers["X-Next-Cursor"] = str(summaries[-1]["summary_id"])
+        return JSONResponse(content=summaries, headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
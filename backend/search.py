@@ -0,0 +1,133 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from models import PDF, Summarization
+
+# SQLite FTS5 index over extracted PDF text and generated summaries.
+# Each row's rowid is pdf_id * ROWID_STRIDE + slot, so re-indexing a document or
+# re-summarizing it with the same model replaces its row instead of adding another.
+SEARCH_TABLE = "search_index"
+ROWID_STRIDE = 8
+SLOTS = {
+    "text": 0,
+    "pretrained": 1,
+    "fine-tuned": 2,
+    "stored": 3,  # Summaries saved in the summarization table
+    "distilled": 4,
+}
+OTHER_SLOT = 7
+# The table stores its own uncompressed copy of every body: snippet() needs it, and
+# replacing a row by rowid needs either the stored copy or contentless_delete (SQLite
+# 3.43+). External content can't be used because pdfs.text is zstd-compressed. The
+# copy is roughly the raw text size on top of the compressed columns, plus the index;
+# bench_compression.py reports both.
+# rowid 0 is never a document (pdf ids start at 1); its row records a completed backfill
+BACKFILL_MARKER_ROWID = 0
+
+
+def fts_available(bind):
+    return bind.dialect.name == "sqlite"
+
+
+def create_search_index(engine):
+    """
+    Creates the FTS5 table and backfills it from existing PDFs and summaries until a
+    backfill has completed. The marker row is committed with the backfilled rows, so
+    an interrupted backfill is simply run again on the next start.
+    """
+    if not fts_available(engine):
+        print("⚠️ Full-text index requires SQLite FTS5, /search will fall back to a table scan")
+        return
+
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+                body, pdf_id UNINDEXED, kind UNINDEXED, tokenize = 'porter unicode61'
+            )
+        """))
+
+    # Backfill through the ORM so compressed text columns are decoded; _index replaces
+    # rows, so rows left by an interrupted run are overwritten rather than duplicated
+    with Session(engine) as db:
+        done = db.execute(
+            text(f"SELECT 1 FROM {SEARCH_TABLE} WHERE rowid = :rowid"), {"rowid": BACKFILL_MARKER_ROWID}
+        ).first()
+        if done:
+            return
+        for pdf_id, pdf_text in db.query(PDF.id, PDF.text).filter(PDF.text.isnot(None)).yield_per(500):
+            index_pdf(db, pdf_id, pdf_text)
+        for pdf_id, summary in db.query(Summarization.pdf_id, Summarization.summary_text).order_by(Summarization.id).yield_per(500):
+            index_summary(db, pdf_id, "stored", summary)
+        db.execute(
+            text(f"INSERT INTO {SEARCH_TABLE} (rowid, body, pdf_id, kind) VALUES (:rowid, '', 0, 'backfilled')"),
+            {"rowid": BACKFILL_MARKER_ROWID},
+        )
+        db.commit()
+        print("✅ Built full-text search index")
+
+
+def _index(db, pdf_id, kind, body):
+    if not fts_available(db.bind):
+        return
+    rowid = pdf_id * ROWID_STRIDE + SLOTS.get(kind, OTHER_SLOT)
+    db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :rowid"), {"rowid": rowid})
+    db.execute(
+        text(f"INSERT INTO {SEARCH_TABLE} (rowid, body, pdf_id, kind) VALUES (:rowid, :body, :pdf_id, :kind)"),
+        {"rowid": rowid, "body": body, "pdf_id": pdf_id, "kind": kind},
+    )
+
+
+def index_pdf(db, pdf_id, extracted_text):
+    """Adds (or replaces) a PDF's extracted text in the index; committed with the caller's session."""
+    _index(db, pdf_id, "text", extracted_text)
+
+
+def index_summary(db, pdf_id, model_type, summary):
+    """Adds (or replaces) the latest summary of a PDF produced by model_type."""
+    _index(db, pdf_id, model_type, summary)
+
+
+def _match_query(query):
+    # Quote every term so user input can't produce an FTS5 syntax error; terms are ANDed
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+def search(db, query, limit=20, offset=0):
+    """Returns ranked matches with highlighted snippets, best first."""
+    if not fts_available(db.bind):
+        return _search_scan(db, query, limit, offset)
+
+    rows = db.execute(text(f"""
+        SELECT s.pdf_id, s.kind, pdfs.filename,
+               snippet({SEARCH_TABLE}, 0, '<b>', '</b>', '…', 16) AS snippet,
+               bm25({SEARCH_TABLE}) AS score
+        FROM {SEARCH_TABLE} AS s
+        JOIN pdfs ON pdfs.id = s.pdf_id
+        WHERE {SEARCH_TABLE} MATCH :query
+        ORDER BY score
+        LIMIT :limit OFFSET :offset
+    """), {"query": _match_query(query), "limit": limit, "offset": offset}).fetchall()
+    return [
+        {"pdf_id": row[0], "source": row[1], "filename": row[2], "snippet": row[3], "score": -row[4]}
+        for row in rows
+    ]
+
+
+def _search_scan(db, query, limit, offset, batch_size=500):
+    """Unranked fallback for databases without FTS5 (scans and decodes pdfs.text)."""
+    needle = query.lower()
+    results, skipped = [], 0
+    for pdf_id, filename, body in db.query(PDF.id, PDF.filename, PDF.text).order_by(PDF.id).yield_per(batch_size):
+        position = (body or "").lower().find(needle)
+        if position < 0:
+            continue
+        if skipped < offset:
+            skipped += 1
+            continue
+        start = max(0, position - 80)
+        results.append({
+            "pdf_id": pdf_id, "source": "text", "filename": filename,
+            "snippet": body[start:position + len(query) + 80], "score": None,
+        })
+        if len(results) == limit:
+            break
+    return results
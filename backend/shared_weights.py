@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+import torch
+from transformers import BartConfig, BartForConditionalGeneration
+
+# Load model weights as read-only memory maps so all uvicorn workers share one copy
+SHARED_WEIGHTS = os.getenv("SHARED_WEIGHTS", "0").lower() in ("1", "true", "yes")
+
+WEIGHTS_FILE = "model.safetensors"
+
+_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def ensure_safetensors(model_path):
+    """Converts a checkpoint to model.safetensors once (atomically, so concurrent workers are safe)."""
+    weights_path = os.path.join(model_path, WEIGHTS_FILE)
+    if os.path.exists(weights_path):
+        return weights_path
+
+    print(f"Converting {model_path} to {WEIGHTS_FILE} for shared loading...")
+    model = BartForConditionalGeneration.from_pretrained(model_path)
+    tmp_dir = tempfile.mkdtemp(dir=model_path)
+    try:
+        model.save_pretrained(tmp_dir, safe_serialization=True)
+        os.replace(os.path.join(tmp_dir, WEIGHTS_FILE), weights_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return weights_path
+
+
+def mmap_state_dict(weights_path):
+    """
+    Maps a safetensors file privately (copy-on-write) and returns tensors viewing it.
+
+    Clean pages of the mapping live in the OS page cache, so every process mapping
+    the same file shares them instead of holding its own copy of the weights.
+    """
+    with open(weights_path, "rb") as f:
+        header_len = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_len))
+    data_start = 8 + header_len
+
+    storage = torch.UntypedStorage.from_file(weights_path, shared=False, nbytes=os.path.getsize(weights_path))
+
+    state_dict = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _DTYPES[info["dtype"]]
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        offset = data_start + info["data_offsets"][0]
+        if offset % itemsize:
+            raise ValueError(f"Tensor {name} is not aligned in {weights_path}")
+        state_dict[name] = torch.empty(0, dtype=dtype).set_(storage, offset // itemsize, info["shape"])
+    return state_dict
+
+
+def load_shared_model(model_path):
+    """Builds a BART model whose parameters point into the memory-mapped weights file."""
+    weights_path = ensure_safetensors(model_path)
+    config = BartConfig.from_pretrained(model_path)
+
+    with torch.device("meta"):
+        model = BartForConditionalGeneration(config)
+    model.load_state_dict(mmap_state_dict(weights_path), strict=False, assign=True)
+    model.tie_weights()
+
+    missing = [name for name, t in list(model.named_parameters()) + list(model.named_buffers()) if t.is_meta]
+    if missing:
+        raise ValueError(f"Weights missing from {weights_path}: {missing[:5]}")
+
+    model.eval()
+    print(f"Loaded {model_path} with memory-mapped shared weights")
+    return model
+
+
+def _parse_kb_fields(lines):
+    fields = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 3 and parts[-1] == "kB":
+            fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields
+
+
+def memory_report():
+    """Reports this worker's RSS split into shared and private memory (Linux /proc)."""
+    report = {"pid": os.getpid(), "shared_weights": SHARED_WEIGHTS}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            rollup = _parse_kb_fields(f.readlines())
+    except OSError:
+        report["error"] = "Memory breakdown requires Linux /proc"
+        return report
+
+    report.update({
+        "rss_mb": round(rollup.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(rollup.get("Pss", 0) / 1024, 1),
+        "shared_mb": round((rollup.get("Shared_Clean", 0) + rollup.get("Shared_Dirty", 0)) / 1024, 1),
+        "private_mb": round((rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0)) / 1024, 1),
+    })
+
+    # Per weights file: how much of the mapping is resident and how much is shared with other workers
+    weights = {}
+    with open("/proc/self/smaps") as f:
+        current = None
+        for line in f:
+            parts = line.split()
+            if "-" in parts[0] and len(parts) >= 5 and not parts[0].endswith(":"):
+                path = parts[5] if len(parts) >= 6 else ""
+                current = weights.setdefault(path, {"Rss": 0, "Pss": 0, "Shared_Clean": 0}) if path.endswith(".safetensors") else None
+            elif current is not None and parts[0].rstrip(":") in current:
+                current[parts[0].rstrip(":")] += int(parts[1])
+    report["weights_files"] = {
+        path: {
+            "rss_mb": round(v["Rss"] / 1024, 1),
+            "pss_mb": round(v["Pss"] / 1024, 1),
+            "shared_mb": round(v["Shared_Clean"] / 1024, 1),
+        }
+        for path, v in weights.items()
+    }
+    return report
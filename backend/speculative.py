@@ -0,0 +1,161 @@
+"""
+Assisted (speculative) decoding: a small draft seq2seq model proposes tokens that
+the target model verifies in one forward pass per step.
+
+Speculative requests use the greedy decoding profile: every summarization step
+keeps its lengths and penalties but decodes one beam without sampling. Assisted
+output matches plain greedy decoding of the target model exactly; the gain is
+wall time per summary.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from transformers import LogitsProcessor, LogitsProcessorList
+
+import metrics
+
+# Profiles that decode speculatively unless the request says otherwise, e.g. "fast" or "balanced,fast"
+SPECULATIVE_PROFILES = {p.strip() for p in os.getenv("SPECULATIVE_PROFILES", "").split(",") if p.strip()}
+
+# Tokens proposed by the draft per step (transformers adapts it with the "heuristic" schedule)
+SPECULATIVE_DRAFT_TOKENS = int(os.getenv("SPECULATIVE_DRAFT_TOKENS", "5"))
+
+# Beam search and sampling settings the greedy decoding profile drops
+_NON_GREEDY_KWARGS = ("num_beams", "do_sample", "top_p", "top_k", "temperature", "early_stopping", "length_penalty")
+
+_local = threading.local()
+_hooked = set()
+
+
+def _count_forward(module, args, output):
+    counts = getattr(_local, "counts", None)
+    if counts is not None:
+        counts["draft" if module is _local.stats.draft else "target"] += 1
+
+
+def _install_hook(model):
+    """Counts decoder forward passes of model while assisted_generate() runs on this thread."""
+    if id(model) not in _hooked:
+        model.register_forward_hook(_count_forward)
+        _hooked.add(id(model))
+
+
+class EosBlockedUntil(LogitsProcessor):
+    """
+    Same rule as min_length: end-of-sequence is impossible before min_length tokens.
+
+    transformers rejects MinLengthLogitsProcessor in assisted generation, so min_length
+    is passed as this processor instead; it also applies to the draft's proposals.
+    """
+
+    def __init__(self, min_length, eos_token_id):
+        self.min_length = min_length
+        self.eos_token_ids = [eos_token_id] if isinstance(eos_token_id, int) else list(eos_token_id)
+
+    def __call__(self, input_ids, scores):
+        if input_ids.shape[-1] < self.min_length:
+            scores = scores.clone()
+            scores[:, self.eos_token_ids] = -float("inf")
+        return scores
+
+
+def greedy_settings(generate_kwargs):
+    """The greedy decoding profile of a step's settings: same lengths and penalties, one beam, no sampling."""
+    kwargs = {k: v for k, v in generate_kwargs.items() if k not in _NON_GREEDY_KWARGS}
+    kwargs.update(num_beams=1, do_sample=False)
+    return kwargs
+
+
+class SpeculativeStats:
+    """Draft tokens proposed and accepted by the target during one request."""
+
+    def __init__(self, draft):
+        self.draft = draft
+        self.proposed = 0
+        self.accepted = 0
+        self.target_steps = 0
+        self.generated = 0
+        self.chunks = 0
+
+    @property
+    def acceptance_rate(self):
+        return round(self.accepted / self.proposed, 3) if self.proposed else None
+
+    def as_dict(self):
+        return {
+            "proposed": self.proposed,
+            "accepted": self.accepted,
+            "target_steps": self.target_steps,
+            "acceptance_rate": self.acceptance_rate,
+            "chunks": self.chunks,
+        }
+
+
+def current():
+    """The SpeculativeStats of the enclosing speculative_decoding() block on this thread, if any."""
+    return getattr(_local, "stats", None)
+
+
+def decoding_settings(generate_kwargs):
+    """generate_kwargs, switched to the greedy profile inside speculative_decoding()."""
+    return greedy_settings(generate_kwargs) if current() is not None else generate_kwargs
+
+
+@contextmanager
+def speculative_decoding(draft, enabled=True):
+    """Decodes summaries generated inside the block on this thread greedily, with draft as assistant model."""
+    if not enabled or draft is None:
+        yield None
+        return
+    stats = SpeculativeStats(draft)
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = None
+        metrics.increment("speculative_requests")
+        metrics.increment("speculative_proposed", stats.proposed)
+        metrics.increment("speculative_accepted", stats.accepted)
+
+
+def assisted_generate(model, input_tensor, attention_mask, encoder_outputs, **generate_kwargs):
+    """
+    Greedy generate() with the current draft model as assistant.
+
+    Every target forward pass verifies a run of draft tokens and adds one token of its
+    own, so accepted = generated tokens - target passes; each draft forward pass
+    proposes one token.
+    """
+    stats = current()
+    draft = stats.draft
+    _install_hook(model)
+    _install_hook(draft)
+    draft.generation_config.num_assistant_tokens = SPECULATIVE_DRAFT_TOKENS
+
+    kwargs = greedy_settings(generate_kwargs)
+    min_length = kwargs.pop("min_length", 0)
+    eos_token_id = model.generation_config.eos_token_id
+    if min_length and eos_token_id is not None:
+        kwargs["logits_processor"] = LogitsProcessorList([EosBlockedUntil(min_length, eos_token_id)])
+
+    _local.counts = {"target": 0, "draft": 0}
+    try:
+        summary_ids = model.generate(
+            input_tensor,
+            attention_mask=attention_mask,
+            encoder_outputs=encoder_outputs,
+            assistant_model=draft,
+            **kwargs
+        )
+    finally:
+        counts, _local.counts = _local.counts, None
+
+    # The first decoder token is the forced start token, not a decoding step
+    generated = summary_ids.shape[-1] - 1
+    stats.generated += generated
+    stats.chunks += 1
+    stats.target_steps += counts["target"]
+    stats.proposed += counts["draft"]
+    stats.accepted += max(0, generated - counts["target"])
+    return summary_ids
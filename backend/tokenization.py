@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+
+from transformers import BartTokenizer
+
+try:
+    from transformers import BartTokenizerFast
+except ImportError:
+    BartTokenizerFast = None
+
+# Upper bound on token ids kept in the cache (8 bytes each)
+TOKEN_CACHE_MAX_TOKENS = int(os.getenv("TOKEN_CACHE_MAX_TOKENS", "5000000"))
+
+
+def chunk_text(text, chunk_size=1024, overlap=100):
+    """
+    Split text into chunks respecting sentence boundaries when possible.
+    """
+    # Split by sentences
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    
+    for sentence in sentences:
+        sentence_words = sentence.split()
+        sentence_length = len(sentence_words)
+        
+        # If adding this sentence would exceed chunk size and we already have content
+        if current_length + sentence_length > chunk_size and current_length > 0:
+            # Add the current chunk to our list of chunks
+            chunks.append(" ".join(current_chunk))
+            
+            # Start a new chunk with overlap
+            overlap_start = max(0, len(current_chunk) - overlap)
+            current_chunk = current_chunk[overlap_start:]
+            current_length = len(current_chunk)
+        
+        # Add the sentence to the current chunk
+        current_chunk.extend(sentence_words)
+        current_length += sentence_length
+    
+    # Add the last chunk if it has content
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+    
+    return chunks
+
+
+def load_tokenizer(model_path):
+    """Loads the Rust-backed fast BART tokenizer, falling back to the pure-Python one."""
+    if BartTokenizerFast is not None:
+        try:
+            return BartTokenizerFast.from_pretrained(model_path)
+        except Exception as e:
+            print(f"Fast tokenizer unavailable for {model_path} ({e}), using slow tokenizer")
+    return BartTokenizer.from_pretrained(model_path)
+
+
+def tokenizer_key(tokenizer):
+    """
+    Fingerprint of a tokenizer's vocabulary and special tokens.
+
+    Tokenizers producing identical ids (slow/fast variants, or two checkpoints of the
+    same base model) share a key, so they share cache entries.
+    """
+    key = getattr(tokenizer, "_summaize_cache_key", None)
+    if key is None:
+        fingerprint = json.dumps(
+            [sorted(tokenizer.get_vocab().items()), tokenizer.bos_token_id, tokenizer.eos_token_id],
+            ensure_ascii=False,
+        )
+        key = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+        tokenizer._summaize_cache_key = key
+    return key
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class TokenCache:
+    """Thread-safe LRU of token id arrays, bounded by the total number of cached tokens."""
+
+    def __init__(self, max_tokens=TOKEN_CACHE_MAX_TOKENS):
+        self.max_tokens = max_tokens
+        self._entries = OrderedDict()
+        self._tokens = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size(value):
+        return sum(len(ids) for ids in value)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self._size(value)
+        if size > self.max_tokens:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = value
+            self._tokens += size
+            while self._tokens > self.max_tokens:
+                _, evicted = self._entries.popitem(last=False)
+                self._tokens -= self._size(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "tokens": self._tokens, "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache()
+
+
+def encode_document(text, tokenizer, split, max_length=1024):
+    """
+    Tokenizes a document once: split(text) into chunks, encode all chunks in one
+    batched tokenizer call and cache the ids per (document hash, tokenizer, split).
+    Returns one list of token ids per chunk, truncated to max_length.
+    """
+    key = ("document", text_hash(text), tokenizer_key(tokenizer), split.__qualname__, max_length)
+    cached = token_cache.get(key)
+    if cached is None:
+        chunks = split(text)
+        encoded = tokenizer(chunks, max_length=max_length, truncation=True)["input_ids"] if chunks else []
+        cached = tuple(array("l", ids) for ids in encoded)
+        token_cache.put(key, cached)
+    return [list(ids) for ids in cached]
+
+
+def encode_text(text, tokenizer, max_length=1024):
+    """Tokenizes a single text (e.g. joined chunk summaries) through the same cache."""
+    key = ("text", text_hash(text), tokenizer_key(tokenizer), max_length)
+    cached = token_cache.get(key)
+    if cached is None:
+        cached = (array("l", tokenizer(text, max_length=max_length, truncation=True)["input_ids"]),)
+        token_cache.put(key, cached)
+    return list(cached[0])